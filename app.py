@@ -1,15 +1,22 @@
 import os
+import uuid
 import streamlit as st
 import datetime
 from streamlit.components.v1 import html
-from backend.pdf_loader import extract_text_from_pdf, chunk_text
-from backend.embeddings import build_faiss_index
-from backend.retriever import retrieve_top_k
-from backend.ollama_client import ask_ollama
-from backend.translator import translate_text, LANGUAGE_OPTIONS
-from backend.history_manager import load_history, add_to_history
-from backend.quiz_generator import generate_quiz, create_quiz, evaluate_quiz_responses, load_quiz, generate_quiz_html, create_youtube_quiz
-from backend.youtube_processor import youtube_processor
+from backend.index_store import get_or_build_index
+from backend.retriever import retrieve_from_library, retrieve_from_entry
+from backend.library_index import library_index
+from backend.embedding_provider import embedding_provider
+from backend.answer_cache import answer_cache, ANSWER_CACHE_THRESHOLD
+from backend.ollama_client import stream_ollama
+from backend.translator import stream_translation, clean_translation, LANGUAGE_OPTIONS
+from backend.history_manager import add_to_history, query_history, list_history_pdfs, HISTORY_PAGE_SIZE
+from backend.history_search import history_search
+from backend.quiz_generator import evaluate_quiz_responses, load_quiz, generate_quiz_html, run_pdf_quiz_job, run_youtube_quiz_job
+from backend.job_queue import job_queue, DONE, FAILED
+from backend.youtube_processor import youtube_processor, format_timestamp
+from backend.transcription import MAX_VIDEO_SECONDS
+from backend.whisper_manager import whisper_manager
 
 st.set_page_config(page_title="StudyMate - AI PDF Q&A", layout="wide")
 
@@ -24,12 +31,12 @@ if 'quiz_id' in query_params:
         html(html_content, height=800, scrolling=True)
         
         if st.button("← Back to StudyMate"):
-            st.query_params.clear()
+            st.query_params.pop("quiz_id", None)
             st.rerun()
     else:
         st.error("Quiz not found! The link may be invalid or expired.")
         if st.button("← Back to StudyMate"):
-            st.query_params.clear()
+            st.query_params.pop("quiz_id", None)
             st.rerun()
     
     st.stop()
@@ -61,12 +68,14 @@ if 'current_quiz' not in st.session_state:
     st.session_state.current_quiz = None
 if 'quiz_results' not in st.session_state:
     st.session_state.quiz_results = None
-if 'search_history' not in st.session_state:
-    st.session_state.search_history = load_history()
+if 'history_page' not in st.session_state:
+    st.session_state.history_page = 0
 if 'current_pdf' not in st.session_state:
     st.session_state.current_pdf = None
 if 'pdf_text' not in st.session_state:
     st.session_state.pdf_text = ""
+if 'pdf_index_key' not in st.session_state:
+    st.session_state.pdf_index_key = None
 if 'proctor_report' not in st.session_state:
     st.session_state.proctor_report = None
 if 'youtube_url' not in st.session_state:
@@ -75,6 +84,44 @@ if 'youtube_quiz' not in st.session_state:
     st.session_state.youtube_quiz = None
 if 'youtube_error' not in st.session_state:
     st.session_state.youtube_error = None
+if 'pdf_quiz_error' not in st.session_state:
+    st.session_state.pdf_quiz_error = None
+
+# Each browser session gets its own history; the id lives in the URL so a refresh keeps it
+if 'user_id' not in st.session_state:
+    st.session_state.user_id = query_params.get("sid") or uuid.uuid4().hex
+    st.query_params["sid"] = st.session_state.user_id
+
+# Background quiz jobs are tracked in the URL too, so a browser refresh keeps polling them
+for job_param in ("pdf_quiz_job", "youtube_quiz_job"):
+    if job_param not in st.session_state:
+        st.session_state[job_param] = query_params.get(job_param)
+        if st.session_state[job_param]:
+            st.session_state.show_quiz = True
+
+def start_quiz_job(job_param, kind, func, *args, description=""):
+    job_id = job_queue.submit(kind, func, *args, description=description)
+    st.session_state[job_param] = job_id
+    st.query_params[job_param] = job_id
+    # Rerun so the poller (rendered above the button in the PDF tab) and the disabled button pick up the job
+    st.rerun()
+
+@st.fragment(run_every=2)
+def poll_quiz_job(job_param, result_key, error_key):
+    """Poll a background job without blocking the rest of the page"""
+    job = job_queue.get(st.session_state[job_param])
+    if job is None or job["status"] in (DONE, FAILED):
+        st.session_state[job_param] = None
+        st.query_params.pop(job_param, None)
+        if job and job["status"] == DONE:
+            st.session_state[result_key] = job["result"]
+            st.session_state[error_key] = None
+        else:
+            st.session_state[result_key] = None
+            st.session_state[error_key] = job["error"] if job else "Quiz job not found"
+        st.rerun()
+    else:
+        st.info(f"⏳ {job['description']} — {job['status']}... You can keep using StudyMate meanwhile.")
 
 # ----------------- Sidebar for Navigation -----------------
 with st.sidebar:
@@ -108,6 +155,13 @@ with st.sidebar:
     
     if st.session_state.current_pdf:
         st.info(f"**Current PDF:** {st.session_state.current_pdf}")
+    
+    if st.button("📚 Add all uploads to library", use_container_width=True):
+        with st.spinner("Indexing uploaded PDFs..."):
+            for name in sorted(os.listdir(UPLOAD_DIR)):
+                if name.lower().endswith(".pdf"):
+                    library_index.add_pdf(os.path.join(UPLOAD_DIR, name))
+        st.success(f"Library has {len(library_index.list_documents())} PDFs")
 
 # ----------------- Quiz Generator Page -----------------
 if st.session_state.show_quiz:
@@ -123,6 +177,10 @@ if st.session_state.show_quiz:
     tab1, tab2 = st.tabs(["📄 PDF Quiz", "🎥 YouTube Video Quiz"])
     
     with tab1:
+        # Polled before the PDF check so a job survives a refresh that cleared the session
+        if st.session_state.pdf_quiz_job:
+            poll_quiz_job("pdf_quiz_job", "current_quiz", "pdf_quiz_error")
+        
         if not st.session_state.pdf_text:
             st.warning("Please upload a PDF first to generate quizzes.")
         else:
@@ -140,15 +198,18 @@ if st.session_state.show_quiz:
             with col2:
                 num_questions = st.slider("Number of Questions", 3, 20, 5, key="pdf_num_questions")
             
-            if st.button("🎯 Generate Quiz", type="primary", key="generate_pdf_quiz"):
-                with st.spinner("Generating quiz questions..."):
-                    quiz_data = generate_quiz(st.session_state.pdf_text, difficulty, num_questions)
-                    if quiz_data and 'questions' in quiz_data:
-                        form_info = create_quiz(quiz_data, f"Quiz - {st.session_state.current_pdf}")
-                        st.session_state.current_quiz = form_info
-                        st.success("✅ Quiz generated successfully!")
-                    else:
-                        st.error("❌ Failed to generate quiz. Please try again.")
+            if st.button("🎯 Generate Quiz", type="primary", key="generate_pdf_quiz",
+                         disabled=bool(st.session_state.pdf_quiz_job)):
+                # Runs in the background; questions are sampled across the whole PDF
+                start_quiz_job(
+                    "pdf_quiz_job", "pdf_quiz", run_pdf_quiz_job,
+                    st.session_state.pdf_text, difficulty, num_questions,
+                    f"Quiz - {st.session_state.current_pdf}", st.session_state.pdf_index_key,
+                    description="Generating quiz questions"
+                )
+            
+            if st.session_state.pdf_quiz_error:
+                st.error(f"❌ {st.session_state.pdf_quiz_error}")
             
             # Display quiz if available
             if st.session_state.current_quiz:
@@ -193,10 +254,10 @@ if st.session_state.show_quiz:
     with tab2:
         st.subheader("🎥 Generate Quiz from YouTube Video")
         
-        st.info("""
+        st.info(f"""
         **Create quizzes from YouTube videos!**
         - Paste a YouTube URL
-        - Video will be analyzed (max 15 minutes)
+        - Video will be analyzed (max {MAX_VIDEO_SECONDS / 60:.0f} minutes)
         - Quiz questions generated from video content
         """)
         
@@ -222,6 +283,18 @@ if st.session_state.show_quiz:
                     minutes, seconds = divmod(video_info['duration'], 60)
                     st.write(f"**Duration:** {minutes}m {seconds}s")
                     st.write(f"**Views:** {video_info['view_count']:,}")
+                    st.write(f"**Speech model:** {youtube_processor.choose_whisper_model(video_info['duration'])}")
+            
+            whisper_stats = whisper_manager.stats()
+            if whisper_stats:
+                with st.expander("⚙️ Speech model status"):
+                    for name, stat in whisper_stats.items():
+                        pool_note = f" · {stat['pool_workers']} worker processes" if stat["pool_workers"] else ""
+                        if stat["loaded"]:
+                            st.write(f"**{name}:** loaded in {stat['load_seconds']:.1f}s · "
+                                     f"{stat['memory_bytes'] / 2**20:.0f} MiB · used {stat['uses']}×{pool_note}")
+                        else:
+                            st.write(f"**{name}:** not loaded (freed when idle) · used {stat['uses']}×{pool_note}")
             
             # Quiz configuration
             col1, col2 = st.columns(2)
@@ -239,22 +312,16 @@ if st.session_state.show_quiz:
                     key="yt_num_questions"
                 )
             
-            if st.button("🎬 Generate Quiz from Video", type="primary", key="generate_yt_quiz"):
-                with st.spinner("Analyzing video and generating quiz..."):
-                    quiz_data, error = create_youtube_quiz(
-                        youtube_url, 
-                        yt_difficulty, 
-                        yt_num_questions
-                    )
-                    
-                    if error:
-                        st.session_state.youtube_error = error
-                        st.session_state.youtube_quiz = None
-                        st.error(f"❌ Error: {error}")
-                    else:
-                        st.session_state.youtube_quiz = quiz_data
-                        st.session_state.youtube_error = None
-                        st.success("✅ YouTube quiz generated successfully!")
+            if st.button("🎬 Generate Quiz from Video", type="primary", key="generate_yt_quiz",
+                         disabled=bool(st.session_state.youtube_quiz_job)):
+                start_quiz_job(
+                    "youtube_quiz_job", "youtube_quiz", run_youtube_quiz_job,
+                    youtube_url, yt_difficulty, yt_num_questions,
+                    description="Analyzing video and generating quiz"
+                )
+        
+        if st.session_state.youtube_quiz_job:
+            poll_quiz_job("youtube_quiz_job", "youtube_quiz", "youtube_error")
         
         # Display YouTube quiz if available
         if st.session_state.youtube_error:
@@ -274,6 +341,13 @@ if st.session_state.show_quiz:
             **Video Source:** [Watch Original Video]({st.session_state.youtube_url})
             """)
             
+            timed_questions = [q for q in st.session_state.youtube_quiz['questions'] if q.get('timestamp_url')]
+            if timed_questions:
+                with st.expander("⏱️ Where the questions come from"):
+                    for i, question in enumerate(st.session_state.youtube_quiz['questions']):
+                        if question.get('timestamp_url'):
+                            st.markdown(f"**Q{i+1}** · [{format_timestamp(question['timestamp'])}]({question['timestamp_url']})")
+            
             if st.button("🎯 Open YouTube Quiz in New Tab", type="primary", key="open_yt_quiz_btn"):
                 js = f"window.open('{st.session_state.youtube_quiz['share_url']}', '_blank')"
                 st.components.v1.html(f"<script>{js}</script>", height=0)
@@ -329,39 +403,97 @@ elif not st.session_state.show_history:
             st.session_state.current_pdf = uploaded_file.name
 
             try:
-                text = extract_text_from_pdf(file_path)
-                st.session_state.pdf_text = text
-                chunks = chunk_text(text)
-                index, _ = build_faiss_index(chunks)
+                # Reuses the stored index when this PDF was already embedded
+                progress_bar = st.empty()
+
+                def show_progress(fraction, message):
+                    progress_bar.progress(fraction, text=f"📄 {message}")
+
+                entry = get_or_build_index(file_path, progress_callback=show_progress)
+                progress_bar.empty()
+                st.session_state.pdf_text = entry["text"]
+                st.session_state.pdf_index_key = entry["key"]
+                # Appends this PDF's vectors to the shared library (no-op if already there)
+                library_index.add_document(entry)
 
                 st.info("📄 PDF processed into chunks. You can now ask questions!")
+                search_library = st.toggle("📚 Search all uploaded PDFs", value=False, key="search_library")
                 
                 if st.button("🎯 Generate Quiz from this PDF", key="generate_quiz_btn"):
                     st.session_state.show_quiz = True
                     st.rerun()
 
                 if query:
-                    context = retrieve_top_k(query, index, chunks)
-                    prompt = f"Answer the question based on the context:\n\n{context}\n\nQuestion: {query}"
-                    answer = ask_ollama(prompt)
-
-                    st.session_state.search_history = add_to_history(
-                        question=query, 
-                        answer=answer, 
-                        pdf_name=uploaded_file.name
-                    )
+                    answer_scope = "library" if search_library else entry["key"]
+                    query_emb = embedding_provider.encode_query(query)
+                    cached_answer = answer_cache.lookup(answer_scope, query_emb)
+                    if not cached_answer and not search_library:
+                        # Answers persisted in history survive restarts, unlike the in-memory cache
+                        past = history_search.find_similar(
+                            query, st.session_state.user_id, k=1, doc_id=entry["key"],
+                            min_score=ANSWER_CACHE_THRESHOLD, query_embedding=query_emb
+                        )
+                        if past and not past[0]["answer"].startswith("❌"):
+                            sources = retrieve_from_entry(query_emb, entry, k=3)
+                            cached_answer = {
+                                "question": past[0]["question"],
+                                "answer": past[0]["answer"],
+                                "sources": sources,
+                            }
+                            answer_cache.store(answer_scope, query, query_emb, past[0]["answer"], sources)
+
+                    if cached_answer:
+                        # A near-identical question was already answered: skip retrieval and the LLM
+                        answer = cached_answer["answer"]
+                        hits = cached_answer["sources"]
+                        st.caption(f"♻️ Reused the answer to: \"{cached_answer['question']}\"")
+                    else:
+                        # One PDF is searched through its own index; the library only when asked
+                        if search_library:
+                            hits = retrieve_from_library(query, library_index, k=3)
+                        else:
+                            hits = retrieve_from_entry(query_emb, entry, k=3)
+                        context = [hit["text"] for hit in hits]
+                        prompt = f"Answer the question based on the context:\n\n{context}\n\nQuestion: {query}"
 
                     st.subheader("📝 Answer:")
-                    st.write(answer)
-                    
-                    if st.button("🌐 Send to Translator", key="send_to_translator"):
-                        st.session_state.text_to_translate = answer
-                        st.session_state.show_translator = True
-                        st.rerun()
+                    if cached_answer:
+                        st.write(answer)
+                    else:
+                        # Render tokens as they arrive instead of waiting for the full generation
+                        stream_stats = {}
+                        answer = st.write_stream(stream_ollama(prompt, stream_stats))
+                        if stream_stats.get("error"):
+                            st.error(f"❌ Ollama Error: {stream_stats['error']}")
+                        elif "first_token_seconds" in stream_stats:
+                            st.caption(
+                                f"⏱️ First token in {stream_stats['first_token_seconds']:.2f}s · "
+                                f"full answer in {stream_stats['total_seconds']:.2f}s"
+                            )
+                    # A stream can fail after partial output; such answers are not cached, kept or translated
+                    answer_failed = not cached_answer and bool(stream_stats.get("error"))
+                    if not cached_answer and not answer_failed:
+                        answer_cache.store(answer_scope, query, query_emb, answer, hits)
+
+                    if not answer_failed:
+                        add_to_history(
+                            question=query,
+                            answer=answer,
+                            pdf_name=uploaded_file.name,
+                            user_id=st.session_state.user_id,
+                            embedding=query_emb,
+                            doc_id="" if search_library else entry["key"]
+                        )
+                        
+                        if st.button("🌐 Send to Translator", key="send_to_translator"):
+                            st.session_state.text_to_translate = answer
+                            st.session_state.show_translator = True
+                            st.rerun()
 
                     st.subheader("📚 Sources from PDF:")
-                    for i, c in enumerate(context, 1):
-                        st.markdown(f"**{i}.** {c[:300]}...")
+                    for i, hit in enumerate(hits, 1):
+                        source = f" _({hit['pdf_name']}, p. {hit['page']})_" if hit["page"] else ""
+                        st.markdown(f"**{i}.**{source} {hit['text'][:300]}...")
 
             except Exception as e:
                 st.error(f"❌ Error while processing PDF: {e}")
@@ -390,9 +522,17 @@ elif not st.session_state.show_history:
             
             if st.button("Translate", type="primary", key="translate_btn"):
                 if text_input.strip():
-                    with st.spinner("Translating..."):
-                        translated = translate_text(text_input, target_lang)
-                        st.session_state.translated_text = translated
+                    # Show the raw translation while it streams, then replace it with the cleaned result
+                    stream_box = st.empty()
+                    translation_stats = {}
+                    raw_translation = stream_box.write_stream(
+                        stream_translation(text_input, target_lang, translation_stats)
+                    )
+                    stream_box.empty()
+                    if translation_stats.get("error"):
+                        st.error(f"❌ Translation failed: {translation_stats['error']}")
+                    else:
+                        st.session_state.translated_text = clean_translation(raw_translation)
                 else:
                     st.warning("Please enter some text to translate")
             
@@ -418,40 +558,88 @@ else:
             st.session_state.show_history = False
             st.rerun()
     
-    if not st.session_state.search_history:
-        st.info("No search history yet. Ask some questions to build your history!")
-    else:
-        current_pdf_history = [
-            item for item in st.session_state.search_history 
-            if st.session_state.current_pdf and item['pdf_name'] == st.session_state.current_pdf
-        ]
-        all_history = st.session_state.search_history
-        
-        show_all = st.toggle("Show all PDFs history", value=True)
-        display_history = all_history if show_all else current_pdf_history
-        
-        if not display_history:
-            st.info("No history for this PDF yet.")
+    similar_query = st.text_input("🔎 Find a similar past question")
+    if similar_query:
+        similar_items = history_search.find_similar(similar_query, st.session_state.user_id, k=5)
+        if not similar_items:
+            st.info("No similar questions in your history.")
+        for i, history_item in enumerate(similar_items):
+            with st.expander(f"{history_item['similarity']:.0%} match · {history_item['question']}"):
+                st.markdown(f"**Answer:** {history_item['answer']}")
+                st.markdown(f"**PDF:** {history_item['pdf_name']} · **Date:** {history_item['timestamp']}")
+                if st.button(f"🔁 Use this question", key=f"reuse_similar_{i}"):
+                    st.session_state.reuse_question = history_item['question']
+                    st.session_state.show_history = False
+                    st.rerun()
+        st.markdown("---")
+
+    # Filtering and paging happen in SQLite; only the current page is loaded and rendered
+    filter_col1, filter_col2, filter_col3 = st.columns([2, 2, 3])
+    with filter_col1:
+        pdf_options = ["All PDFs"] + list_history_pdfs(st.session_state.user_id)
+        default_pdf = st.session_state.current_pdf if st.session_state.current_pdf in pdf_options else "All PDFs"
+        pdf_filter = st.selectbox("PDF", pdf_options, index=pdf_options.index(default_pdf))
+    with filter_col2:
+        date_range = st.date_input("Date range", value=())
+    with filter_col3:
+        text_filter = st.text_input("Keyword search", help="Results are ranked by relevance, best matches first")
+
+    start_date = date_range[0] if len(date_range) > 0 else None
+    end_date = date_range[1] if len(date_range) > 1 else start_date
+    history_filters = (pdf_filter, start_date, end_date, text_filter)
+    if st.session_state.get("history_filters") != history_filters:
+        st.session_state.history_filters = history_filters
+        st.session_state.history_page = 0
+
+    display_history, total = query_history(
+        user_id=st.session_state.user_id,
+        pdf_name=None if pdf_filter == "All PDFs" else pdf_filter,
+        start_date=start_date,
+        end_date=end_date,
+        text=text_filter.strip() or None,
+        page=st.session_state.history_page,
+        page_size=HISTORY_PAGE_SIZE,
+    )
+
+    if not total:
+        if any([pdf_filter != "All PDFs", start_date, text_filter]):
+            st.info("No history matches these filters.")
         else:
-            for i, history_item in enumerate(reversed(display_history)):
-                with st.expander(f"📄 {history_item['pdf_name']} - {history_item['timestamp']}"):
-                    st.markdown(f"**Question:** {history_item['question']}")
-                    st.markdown(f"**Answer:** {history_item['answer']}")
-                    st.markdown(f"**PDF:** {history_item['pdf_name']}")
-                    st.markdown(f"**Date:** {history_item['timestamp']}")
-                    
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        if st.button(f"🔁 Use this question", key=f"reuse_{i}"):
-                            st.session_state.reuse_question = history_item['question']
-                            st.session_state.show_history = False
-                            st.rerun()
-                    with col2:
-                        if st.button(f"🌐 Translate answer", key=f"translate_{i}"):
-                            st.session_state.text_to_translate = history_item['answer']
-                            st.session_state.show_translator = True
-                            st.session_state.show_history = False
-                            st.rerun()
+            st.info("No search history yet. Ask some questions to build your history!")
+    else:
+        page_count = (total + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+        for i, history_item in enumerate(display_history):
+            with st.expander(f"📄 {history_item['pdf_name']} - {history_item['timestamp']}"):
+                st.markdown(f"**Question:** {history_item['question']}")
+                st.markdown(f"**Answer:** {history_item['answer']}")
+                st.markdown(f"**PDF:** {history_item['pdf_name']}")
+                st.markdown(f"**Date:** {history_item['timestamp']}")
+
+                col1, col2 = st.columns(2)
+                with col1:
+                    if st.button(f"🔁 Use this question", key=f"reuse_{i}"):
+                        st.session_state.reuse_question = history_item['question']
+                        st.session_state.show_history = False
+                        st.rerun()
+                with col2:
+                    if st.button(f"🌐 Translate answer", key=f"translate_{i}"):
+                        st.session_state.text_to_translate = history_item['answer']
+                        st.session_state.show_translator = True
+                        st.session_state.show_history = False
+                        st.rerun()
+
+        prev_col, page_col, next_col = st.columns([1, 3, 1])
+        with prev_col:
+            if st.button("⬅️ Newer", disabled=st.session_state.history_page == 0, use_container_width=True):
+                st.session_state.history_page -= 1
+                st.rerun()
+        with page_col:
+            st.caption(f"Page {st.session_state.history_page + 1} of {page_count} · {total} items")
+        with next_col:
+            if st.button("Older ➡️", disabled=st.session_state.history_page + 1 >= page_count,
+                         use_container_width=True):
+                st.session_state.history_page += 1
+                st.rerun()
 
 # ----------------- Footer -----------------
 st.markdown("---")
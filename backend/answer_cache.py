@@ -0,0 +1,68 @@
+import os
+import threading
+import numpy as np
+
+ANSWER_CACHE_ENABLED = os.environ.get("STUDYMATE_ANSWER_CACHE", "1") != "0"
+# Cosine similarity above which two questions count as the same question
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("STUDYMATE_ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_MAX_PER_SCOPE = 256
+
+
+class AnswerCache:
+    """
+    Remembers answered questions per scope (a document id, or "library")
+    and returns a stored answer when a new question's embedding is close
+    enough to one already answered. Embeddings must be L2-normalised.
+    """
+
+    def __init__(self, threshold=ANSWER_CACHE_THRESHOLD, max_per_scope=ANSWER_CACHE_MAX_PER_SCOPE,
+                 enabled=ANSWER_CACHE_ENABLED):
+        self.threshold = threshold
+        self.max_per_scope = max_per_scope
+        self.enabled = enabled
+        self._scopes = {}  # scope -> {"vectors": ndarray, "entries": list}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, scope, query_embedding):
+        """Return the closest cached entry above the threshold, or None"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            cached = self._scopes.get(scope)
+            if not cached or not cached["entries"]:
+                self.misses += 1
+                return None
+            scores = cached["vectors"] @ np.asarray(query_embedding, dtype="float32").reshape(-1)
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(cached["entries"][best], similarity=float(scores[best]))
+
+    def store(self, scope, question, query_embedding, answer, sources):
+        """Cache an answer; the oldest entry in the scope is dropped when it is full"""
+        if not self.enabled:
+            return
+        vector = np.asarray(query_embedding, dtype="float32").reshape(1, -1)
+        entry = {"question": question, "answer": answer, "sources": sources}
+        with self._lock:
+            cached = self._scopes.get(scope)
+            if cached is None:
+                self._scopes[scope] = {"vectors": vector.copy(), "entries": [entry]}
+                return
+            cached["vectors"] = np.vstack([cached["vectors"], vector])[-self.max_per_scope:]
+            cached["entries"] = (cached["entries"] + [entry])[-self.max_per_scope:]
+
+    def clear(self, scope=None):
+        with self._lock:
+            if scope is None:
+                self._scopes.clear()
+            else:
+                self._scopes.pop(scope, None)
+
+
+# Singleton instance
+answer_cache = AnswerCache()
@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import threading
+import subprocess
+import numpy as np
+from backend.transcription import SAMPLE_RATE, MAX_VIDEO_SECONDS
+
+# Audio handed to transcription per read; bounds the decoder's memory use
+CHUNK_SECONDS = 30
+BYTES_PER_SAMPLE = 2  # s16le
+# ffmpeg gives up on a remote stream that delivers nothing for this long
+READ_TIMEOUT_SECONDS = float(os.environ.get("STUDYMATE_STREAM_READ_TIMEOUT", "30"))
+# Hard limit on one decode, including time blocked on a slow transcriber,
+# so a stalled stream can never hold a job worker forever
+STREAM_DEADLINE_SECONDS = float(os.environ.get("STUDYMATE_STREAM_DEADLINE", str(2 * MAX_VIDEO_SECONDS)))
+# Tail of ffmpeg's log quoted in errors
+STDERR_TAIL_BYTES = 2000
+
+
+def ffmpeg_available():
+    return shutil.which("ffmpeg") is not None
+
+
+def select_audio_url(info):
+    """
+    Direct media URL and HTTP headers of the best audio-only format in a
+    yt-dlp extractor result, or (None, None) when it has none.
+    """
+    audio_formats = [
+        f for f in info.get("formats") or []
+        if f.get("url") and f.get("acodec") not in (None, "none") and f.get("vcodec") in (None, "none")
+        and f.get("protocol", "https") in ("http", "https")
+    ]
+    if not audio_formats:
+        return None, None
+    best = max(audio_formats, key=lambda f: f.get("abr") or f.get("tbr") or 0)
+    return best["url"], best.get("http_headers") or info.get("http_headers") or {}
+
+
+def iter_pcm_chunks(source, headers=None, chunk_seconds=CHUNK_SECONDS,
+                    read_timeout=READ_TIMEOUT_SECONDS, deadline_seconds=STREAM_DEADLINE_SECONDS):
+    """
+    Decode a URL or file with ffmpeg straight to 16 kHz mono PCM and yield
+    it as float32 arrays of up to chunk_seconds, as decoding progresses.
+    The ffmpeg process is killed if the consumer stops early or the decode
+    runs past deadline_seconds; a failed or timed-out decode raises
+    RuntimeError with ffmpeg's message. ffmpeg's log goes to a temp file,
+    so a chatty decoder cannot block on a full stderr pipe.
+    """
+    cmd = ["ffmpeg", "-nostdin", "-loglevel", "error", "-rw_timeout", str(int(read_timeout * 1_000_000))]
+    if headers:
+        cmd += ["-headers", "".join(f"{key}: {value}\r\n" for key, value in headers.items())]
+    cmd += ["-i", source, "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-"]
+
+    chunk_bytes = int(chunk_seconds * SAMPLE_RATE) * BYTES_PER_SAMPLE
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file)
+        timed_out = threading.Event()
+
+        def kill_on_deadline():
+            timed_out.set()
+            process.kill()
+
+        deadline = threading.Timer(deadline_seconds, kill_on_deadline)
+        deadline.daemon = True
+        deadline.start()
+        try:
+            pending = b""
+            while True:
+                data = process.stdout.read(chunk_bytes - len(pending))
+                if not data:
+                    break
+                pending += data
+                if len(pending) == chunk_bytes:
+                    yield np.frombuffer(pending, dtype="<i2").astype("float32") / 32768.0
+                    pending = b""
+
+            returncode = process.wait()
+            if timed_out.is_set():
+                raise RuntimeError(f"ffmpeg timed out after {deadline_seconds:.0f}s")
+            if returncode != 0:
+                stderr_file.seek(max(0, stderr_file.seek(0, os.SEEK_END) - STDERR_TAIL_BYTES))
+                message = stderr_file.read().decode("utf-8", errors="replace").strip()
+                raise RuntimeError(f"ffmpeg failed: {message or returncode}")
+
+            # An odd trailing byte cannot form a sample
+            pending = pending[:len(pending) - len(pending) % BYTES_PER_SAMPLE]
+            if pending:
+                yield np.frombuffer(pending, dtype="<i2").astype("float32") / 32768.0
+        finally:
+            deadline.cancel()
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
@@ -0,0 +1,32 @@
+import os
+import sqlite3
+import threading
+
+DB_PATH = os.environ.get("STUDYMATE_DB_PATH", "data/studymate.sqlite3")
+
+
+class Database:
+    """
+    Per-thread SQLite connections in WAL mode, so Streamlit sessions and
+    background jobs can read while another thread writes. The schema
+    script runs once per connection and must be idempotent.
+    """
+
+    def __init__(self, path=DB_PATH, schema=""):
+        self.path = path
+        self.schema = schema
+        self._local = threading.local()
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            if self.schema:
+                conn.executescript(self.schema)
+            self._local.conn = conn
+        return conn
@@ -0,0 +1,114 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+import faiss
+
+# Defaults can be overridden per deployment without touching code
+DEFAULT_MODEL_NAME = os.environ.get("STUDYMATE_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+DEFAULT_DEVICE = os.environ.get("STUDYMATE_EMBEDDING_DEVICE") or None
+DEFAULT_BATCH_SIZE = int(os.environ.get("STUDYMATE_EMBEDDING_BATCH_SIZE", "32"))
+DEFAULT_NUM_THREADS = int(os.environ.get("STUDYMATE_EMBEDDING_THREADS", "0"))
+QUERY_CACHE_SIZE = int(os.environ.get("STUDYMATE_QUERY_CACHE_SIZE", "1024"))
+
+
+def normalize_query(text):
+    """Case- and whitespace-insensitive form of a query, used as the cache key"""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class EmbeddingProvider:
+    """
+    Owns the single SentenceTransformer instance used for both index
+    building and query encoding. The model is loaded on first use.
+    """
+
+    def __init__(self, model_name=DEFAULT_MODEL_NAME, device=DEFAULT_DEVICE,
+                 batch_size=DEFAULT_BATCH_SIZE, num_threads=DEFAULT_NUM_THREADS):
+        self.model_name = model_name
+        self.device = device
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self._model = None
+        self._lock = threading.Lock()
+        self._query_cache = OrderedDict()
+        self._query_cache_size = QUERY_CACHE_SIZE
+        self._query_cache_lock = threading.Lock()
+
+    def configure(self, model_name=None, device=None, batch_size=None, num_threads=None):
+        """Change settings; a different model name or device drops the loaded model"""
+        with self._lock:
+            if model_name and model_name != self.model_name:
+                self.model_name = model_name
+                self._model = None
+                self.clear_query_cache()
+            if device and device != self.device:
+                self.device = device
+                self._model = None
+            if batch_size:
+                self.batch_size = batch_size
+            if num_threads:
+                self.num_threads = num_threads
+
+    @property
+    def is_loaded(self):
+        return self._model is not None
+
+    def get_model(self):
+        """Return the model, loading it on the first call"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    # Imported here so importing the backend does not pull in torch
+                    from sentence_transformers import SentenceTransformer
+                    if self.num_threads:
+                        import torch
+                        torch.set_num_threads(self.num_threads)
+                    self._model = SentenceTransformer(self.model_name, device=self.device)
+        return self._model
+
+    @property
+    def dimension(self):
+        return self.get_model().get_sentence_embedding_dimension()
+
+    def encode(self, texts, batch_size=None, normalize=True):
+        """Encode a list of texts into a float32 matrix, L2-normalised by default"""
+        embeddings = self.get_model().encode(
+            list(texts),
+            batch_size=batch_size or self.batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+        if normalize:
+            faiss.normalize_L2(embeddings)
+        return embeddings
+
+    def encode_query(self, query):
+        """
+        Encode one query as a 1 x dim matrix, served from a bounded LRU cache
+        keyed by the normalised query text. Callers must not modify the result.
+        """
+        key = normalize_query(query)
+        with self._query_cache_lock:
+            embedding = self._query_cache.get(key)
+            if embedding is not None:
+                self._query_cache.move_to_end(key)
+                return embedding
+
+        embedding = self.encode([key])
+        with self._query_cache_lock:
+            self._query_cache[key] = embedding
+            self._query_cache.move_to_end(key)
+            while len(self._query_cache) > self._query_cache_size:
+                self._query_cache.popitem(last=False)
+        return embedding
+
+    def clear_query_cache(self):
+        with self._query_cache_lock:
+            self._query_cache.clear()
+
+
+# Singleton instance shared by the index builder and the retriever
+embedding_provider = EmbeddingProvider()
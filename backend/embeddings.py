@@ -1,13 +1,150 @@
+import os
+import json
+import shutil
 import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from backend.embedding_provider import embedding_provider
+from backend.index_factory import (
+    create_index, train_index, choose_index_type, FLAT_MAX_VECTORS, TRAIN_SAMPLE_SIZE
+)
 
-model = SentenceTransformer("all-MiniLM-L6-v2")
+CHECKPOINT_CONFIG_FILE = "checkpoint.json"
 
-def build_faiss_index(chunks):
-    embeddings = model.encode(chunks, convert_to_numpy=True)
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatIP(dim)
-    faiss.normalize_L2(embeddings)
-    index.add(embeddings)
+
+def iter_batches(items, batch_size):
+    """Group any iterable into lists of at most batch_size items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _batch_path(checkpoint_dir, batch_number):
+    return os.path.join(checkpoint_dir, f"batch_{batch_number:06d}.npy")
+
+
+def _prepare_checkpoint(checkpoint_dir, batch_size):
+    """Create the checkpoint dir, discarding batches written with a different batch size"""
+    config_path = os.path.join(checkpoint_dir, CHECKPOINT_CONFIG_FILE)
+    config = {"batch_size": batch_size, "model_name": embedding_provider.model_name}
+    if os.path.exists(config_path):
+        try:
+            with open(config_path, "r") as f:
+                if json.load(f) == config:
+                    return
+        except (json.JSONDecodeError, OSError):
+            pass
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    with open(config_path, "w") as f:
+        json.dump(config, f)
+
+
+def _load_batch(checkpoint_dir, batch_number, expected_rows):
+    path = _batch_path(checkpoint_dir, batch_number)
+    if not os.path.exists(path):
+        return None
+    try:
+        embeddings = np.load(path)
+    except (OSError, ValueError):
+        return None
+    return embeddings if embeddings.shape[0] == expected_rows else None
+
+
+def _save_batch(checkpoint_dir, batch_number, embeddings):
+    path = _batch_path(checkpoint_dir, batch_number)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, embeddings)
+    os.replace(tmp_path, path)
+
+
+def clear_checkpoint(checkpoint_dir):
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+
+
+def build_faiss_index(chunks, batch_size=None, progress_callback=None,
+                      checkpoint_dir=None, keep_embeddings=False, index_type=None):
+    """
+    Encode chunks batch by batch and append each batch to a FAISS index.
+
+    chunks may be a list or any iterable (for example a generator still
+    reading the PDF), so encoding starts as soon as the first batch is
+    ready. progress_callback(done, total) is called after every batch;
+    total is None when chunks has no length. With checkpoint_dir set, each
+    encoded batch is saved there and reused when an interrupted build is
+    run again. Returns (index, embeddings); embeddings is None unless
+    keep_embeddings is set, to keep memory bounded by the index itself.
+
+    index_type is passed to the index factory. Types that need training
+    (IVF) buffer the first batches until there is enough data to train on.
+    """
+    batch_size = batch_size or embedding_provider.batch_size
+    total = len(chunks) if hasattr(chunks, "__len__") else None
+    if checkpoint_dir:
+        _prepare_checkpoint(checkpoint_dir, batch_size)
+
+    # Without a known size "auto" cannot be resolved up front; buffer until
+    # the corpus is either finished or clearly past the flat-index limit
+    resolved_type = None
+    if total is not None or (index_type and index_type != "auto"):
+        resolved_type = choose_index_type(total or 0, index_type)
+    buffer_limit = FLAT_MAX_VECTORS if resolved_type is None else TRAIN_SAMPLE_SIZE
+
+    index = None
+    pending = []
+    pending_rows = 0
+    kept = [] if keep_embeddings else None
+    done = 0
+
+    def flush(num_vectors):
+        nonlocal index, pending, pending_rows, resolved_type
+        buffered = np.vstack(pending)
+        if index is None:
+            if resolved_type is None:
+                resolved_type = choose_index_type(num_vectors, index_type)
+            index = create_index(buffered.shape[1], num_vectors, resolved_type)
+            train_index(index, buffered)
+        index.add(buffered)
+        pending, pending_rows = [], 0
+
+    for batch_number, batch in enumerate(iter_batches(chunks, batch_size)):
+        embeddings = None
+        if checkpoint_dir:
+            embeddings = _load_batch(checkpoint_dir, batch_number, len(batch))
+        if embeddings is None:
+            embeddings = embedding_provider.encode(batch, batch_size=batch_size)
+            if checkpoint_dir:
+                _save_batch(checkpoint_dir, batch_number, embeddings)
+
+        if index is not None:
+            index.add(embeddings)
+        else:
+            pending.append(embeddings)
+            pending_rows += len(embeddings)
+            if resolved_type in ("flat", "hnsw") or pending_rows >= buffer_limit:
+                # Reaching the buffer limit means the corpus is at least this large
+                flush(max(total or 0, done + len(batch)))
+
+        if kept is not None:
+            kept.append(embeddings)
+
+        done += len(batch)
+        if progress_callback:
+            progress_callback(done, total)
+
+    if pending:
+        flush(done)
+
+    if index is None:
+        # Empty document: still return a searchable (empty) index
+        index = faiss.IndexFlatIP(embedding_provider.dimension)
+
+    embeddings = None
+    if kept is not None:
+        embeddings = np.vstack(kept) if kept else np.zeros((0, index.d), dtype="float32")
     return index, embeddings
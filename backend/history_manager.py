@@ -1,64 +1,387 @@
 import json
 import os
+import re
+import sqlite3
+import hashlib
 import datetime
+import threading
+import numpy as np
+from backend.db import Database, DB_PATH
 
 HISTORY_FILE = "data/search_history.json"
+# Number of most recent items kept; 0 keeps everything
+HISTORY_RETENTION = int(os.environ.get("STUDYMATE_HISTORY_RETENTION", "10000"))
+HISTORY_PAGE_SIZE = 10
+# Items imported from the old global history file belong to every user
+SHARED_USER_ID = ""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    item_key TEXT NOT NULL UNIQUE,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    pdf_name TEXT NOT NULL DEFAULT '',
+    timestamp TEXT NOT NULL,
+    user_id TEXT NOT NULL DEFAULT '',
+    doc_id TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_history_pdf_name ON history(pdf_name, id);
+CREATE TABLE IF NOT EXISTS history_embeddings (
+    history_id INTEGER PRIMARY KEY REFERENCES history(id) ON DELETE CASCADE,
+    vector BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_db = Database(DB_PATH, SCHEMA)
+_migrate_lock = threading.Lock()
+_migrated = False
+# Set once the FTS5 index exists; keyword search falls back to LIKE without it
+_fts_enabled = False
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+    question, answer, content='history', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN
+    INSERT INTO history_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer);
+END;
+CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history BEGIN
+    INSERT INTO history_fts(history_fts, rowid, question, answer)
+    VALUES ('delete', old.id, old.question, old.answer);
+END;
+"""
+
+
+def _history_key(question, answer, pdf_name, user_id=SHARED_USER_ID, doc_id=""):
+    """Exact duplicates (same user, question, answer and PDF) share one key"""
+    raw = f"{question}\0{answer}\0{pdf_name}"
+    if user_id:
+        raw = f"{user_id}\0{raw}"
+    if doc_id:
+        raw = f"{raw}\0{doc_id}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _row_to_item(row):
+    return {
+        "question": row["question"],
+        "answer": row["answer"],
+        "timestamp": row["timestamp"],
+        "pdf_name": row["pdf_name"],
+    }
+
+
+def _insert(conn, item, user_id=SHARED_USER_ID, doc_id=""):
+    cursor = conn.execute(
+        "INSERT OR IGNORE INTO history (item_key, question, answer, pdf_name, timestamp, user_id, doc_id) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (
+            _history_key(item["question"], item["answer"], item["pdf_name"], user_id, doc_id),
+            item["question"],
+            item["answer"],
+            item["pdf_name"],
+            item["timestamp"],
+            user_id,
+            doc_id,
+        ),
+    )
+    return cursor.lastrowid if cursor.rowcount else None
+
+
+def _prune(conn, last_id):
+    """Drop everything older than the retention window, found through the primary key"""
+    if HISTORY_RETENTION > 0 and last_id > HISTORY_RETENTION:
+        conn.execute("DELETE FROM history WHERE id <= ?", (last_id - HISTORY_RETENTION,))
+
+
+def _connection():
+    conn = _db.connection()
+    _migrate_json_history(conn)
+    return conn
 
-def load_history():
-    """Load search history from file"""
-    if os.path.exists(HISTORY_FILE):
-        try:
-            with open(HISTORY_FILE, 'r') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
-            return []
-    return []
 
-def save_history(history):
-    """Save search history to file"""
+def _ensure_columns(conn):
+    """
+    Databases created before history was partitioned per user lack user_id,
+    and those created before answers were tied to document content lack doc_id
+    """
+    columns = [row["name"] for row in conn.execute("PRAGMA table_info(history)")]
+    if "user_id" not in columns:
+        with conn:
+            conn.execute("ALTER TABLE history ADD COLUMN user_id TEXT NOT NULL DEFAULT ''")
+    if "doc_id" not in columns:
+        with conn:
+            conn.execute("ALTER TABLE history ADD COLUMN doc_id TEXT NOT NULL DEFAULT ''")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_history_user_id ON history(user_id, id)")
+
+
+def _ensure_fts(conn):
+    """Create the FTS5 keyword index, backfilling it from rows written before it existed"""
+    global _fts_enabled
+    existed = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'history_fts'"
+    ).fetchone()
     try:
-        os.makedirs("data", exist_ok=True)
-        with open(HISTORY_FILE, 'w') as f:
-            json.dump(history, f, indent=2)
-    except Exception as e:
-        print(f"Error saving history: {e}")
+        with conn:
+            conn.executescript(FTS_SCHEMA)
+            if not existed:
+                conn.execute("INSERT INTO history_fts(history_fts) VALUES ('rebuild')")
+        _fts_enabled = True
+    except sqlite3.OperationalError as e:
+        print(f"SQLite FTS5 unavailable, keyword search uses LIKE: {e}")
+
+
+def _migrate_json_history(conn):
+    """One-shot import of the legacy search_history.json; the file is left in place"""
+    global _migrated
+    if _migrated:
+        return
+    with _migrate_lock:
+        if _migrated:
+            return
+        _ensure_columns(conn)
+        _ensure_fts(conn)
+        if conn.execute("SELECT 1 FROM store_meta WHERE key = 'history_json_migrated'").fetchone():
+            _migrated = True
+            return
+        items = []
+        if os.path.exists(HISTORY_FILE):
+            try:
+                with open(HISTORY_FILE, 'r') as f:
+                    items = json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"Skipping history file {HISTORY_FILE}: {e}")
+        with conn:
+            for item in items:
+                _insert(conn, {
+                    "question": item.get("question", ""),
+                    "answer": item.get("answer", ""),
+                    "timestamp": item.get("timestamp", ""),
+                    "pdf_name": item.get("pdf_name", ""),
+                })
+            conn.execute(
+                "INSERT OR REPLACE INTO store_meta (key, value) VALUES ('history_json_migrated', ?)",
+                (datetime.datetime.now().isoformat(),),
+            )
+        _migrated = True
+
+
+def _user_clause(user_id):
+    """SQL filter for one user's items plus the shared legacy ones; None means everyone"""
+    if user_id is None:
+        return "1 = 1", []
+    return "user_id IN (?, ?)", [user_id, SHARED_USER_ID]
 
-def add_to_history(question, answer, pdf_name=""):
-    """Add a new item to search history and return updated history"""
-    history = load_history()
-    
-    # Create new history item
+
+def load_history(user_id=None):
+    """Load search history, oldest first"""
+    where, params = _user_clause(user_id)
+    try:
+        rows = _connection().execute(
+            f"SELECT question, answer, timestamp, pdf_name FROM history WHERE {where} ORDER BY id",
+            params,
+        ).fetchall()
+        return [_row_to_item(row) for row in rows]
+    except sqlite3.Error as e:
+        print(f"Error loading history: {e}")
+        return []
+
+
+def add_to_history(question, answer, pdf_name="", user_id=SHARED_USER_ID, embedding=None, doc_id=""):
+    """
+    Append an item to search history. Returns the new item, or None when
+    the exact same question/answer/PDF is already recorded for this user.
+    The question embedding, when given, is kept for similarity search;
+    doc_id (the PDF's index key) identifies the document by content.
+    """
     history_item = {
         "question": question,
         "answer": answer,
         "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "pdf_name": pdf_name
     }
-    
-    # Add to history (avoid exact duplicates)
-    if not any(
-        item['question'] == question and 
-        item['answer'] == answer and 
-        item['pdf_name'] == pdf_name 
-        for item in history
-    ):
-        history.append(history_item)
-        
-        # Keep only last 100 items to prevent file from growing too large
-        history = history[-100:]
-        
-        # Save to file
-        save_history(history)
-    
-    return history
-
-def clear_history():
-    """Clear all search history"""
-    if os.path.exists(HISTORY_FILE):
-        os.remove(HISTORY_FILE)
+
+    try:
+        conn = _connection()
+        with conn:
+            item_id = _insert(conn, history_item, user_id, doc_id)
+            if item_id is None:
+                return None
+            if embedding is not None:
+                _insert_vector(conn, item_id, embedding)
+            _prune(conn, item_id)
+        return history_item
+    except sqlite3.Error as e:
+        print(f"Error saving history: {e}")
+        return None
+
+
+def clear_history(user_id=None):
+    """Clear one user's search history, or all of it when user_id is None"""
+    try:
+        with _connection() as conn:
+            if user_id is None:
+                conn.execute("DELETE FROM history")
+            else:
+                conn.execute("DELETE FROM history WHERE user_id = ?", (user_id,))
+    except sqlite3.Error as e:
+        print(f"Error clearing history: {e}")
     return []
 
-def get_history_by_pdf(pdf_name):
+
+def _fts_query(text):
+    """Quote every word so user input is never parsed as FTS syntax; the last word matches as a prefix"""
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    return " ".join(f'"{word}"' for word in words) + " *"
+
+
+def _like_clause(text):
+    """Keyword filter on question and answer by LIKE scan, for SQLite builds without FTS5"""
+    pattern = "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    return "(question LIKE ? ESCAPE '\\' OR answer LIKE ? ESCAPE '\\')", [pattern, pattern]
+
+
+def _insert_vector(conn, item_id, embedding):
+    conn.execute(
+        "INSERT OR REPLACE INTO history_embeddings (history_id, vector) VALUES (?, ?)",
+        (item_id, np.asarray(embedding, dtype="float32").reshape(-1).tobytes()),
+    )
+
+
+def save_history_embeddings(embeddings):
+    """Store question embeddings for existing items, given as {history id: vector}"""
+    try:
+        with _connection() as conn:
+            for item_id, embedding in embeddings.items():
+                _insert_vector(conn, item_id, embedding)
+    except sqlite3.Error as e:
+        print(f"Error saving history embeddings: {e}")
+
+
+def get_history_since(after_id, limit=1000):
+    """
+    Items with an id above after_id, oldest first, with their id, user_id, PDF
+    name, doc_id and stored question embedding (None when it was never computed).
+    """
+    try:
+        rows = _connection().execute(
+            "SELECT history.id, history.user_id, history.pdf_name, history.doc_id, history.question, "
+            "history_embeddings.vector "
+            "FROM history LEFT JOIN history_embeddings ON history_embeddings.history_id = history.id "
+            "WHERE history.id > ? ORDER BY history.id LIMIT ?",
+            (after_id, limit),
+        ).fetchall()
+    except sqlite3.Error as e:
+        print(f"Error loading history: {e}")
+        return []
+    return [
+        {
+            "id": row["id"],
+            "user_id": row["user_id"],
+            "pdf_name": row["pdf_name"],
+            "doc_id": row["doc_id"],
+            "question": row["question"],
+            "embedding": np.frombuffer(row["vector"], dtype="float32") if row["vector"] else None,
+        }
+        for row in rows
+    ]
+
+
+def get_history_items(ids):
+    """Look items up by id; ids that were pruned or cleared are missing from the result"""
+    if not ids:
+        return {}
+    try:
+        rows = _connection().execute(
+            "SELECT id, question, answer, timestamp, pdf_name FROM history "
+            f"WHERE id IN ({', '.join('?' * len(ids))})",
+            list(ids),
+        ).fetchall()
+        return {row["id"]: _row_to_item(row) for row in rows}
+    except sqlite3.Error as e:
+        print(f"Error loading history: {e}")
+        return {}
+
+
+def get_history_by_pdf(pdf_name, user_id=None):
     """Get history filtered by PDF name"""
-    history = load_history()
-    return [item for item in history if item['pdf_name'] == pdf_name]
\ No newline at end of file
+    items, _ = query_history(user_id=user_id, pdf_name=pdf_name, page_size=0)
+    return list(reversed(items))
+
+
+def query_history(user_id=None, pdf_name=None, start_date=None, end_date=None, text=None,
+                  page=0, page_size=HISTORY_PAGE_SIZE):
+    """
+    Filter and page history in SQLite, newest first. Dates are inclusive
+    datetime.date objects; text matches question or answer through the
+    FTS5 index and then orders results by bm25 relevance (newest first
+    among equals). Returns (items on this page, total matching items);
+    page_size 0 returns all.
+    """
+    try:
+        conn = _connection()
+    except sqlite3.Error as e:
+        print(f"Error loading history: {e}")
+        return [], 0
+
+    where, params = _user_clause(user_id)
+    clauses = [where]
+    tables = "history"
+    order = "history.id DESC"
+    if pdf_name:
+        clauses.append("pdf_name = ?")
+        params.append(pdf_name)
+    if start_date:
+        clauses.append("timestamp >= ?")
+        params.append(start_date.strftime("%Y-%m-%d"))
+    if end_date:
+        clauses.append("timestamp < ?")
+        params.append((end_date + datetime.timedelta(days=1)).strftime("%Y-%m-%d"))
+    if text:
+        match = _fts_query(text) if _fts_enabled else None
+        if match:
+            tables = "history JOIN history_fts ON history_fts.rowid = history.id"
+            clauses.append("history_fts MATCH ?")
+            params.append(match)
+            order = "bm25(history_fts), history.id DESC"
+        else:
+            like_clause, like_params = _like_clause(text)
+            clauses.append(like_clause)
+            params.extend(like_params)
+    where = " AND ".join(clauses)
+
+    try:
+        total = conn.execute(f"SELECT COUNT(*) FROM {tables} WHERE {where}", params).fetchone()[0]
+        sql = (
+            "SELECT history.question, history.answer, history.timestamp, history.pdf_name "
+            f"FROM {tables} WHERE {where} ORDER BY {order}"
+        )
+        if page_size:
+            sql += " LIMIT ? OFFSET ?"
+            params = params + [page_size, page * page_size]
+        rows = conn.execute(sql, params).fetchall()
+        return [_row_to_item(row) for row in rows], total
+    except sqlite3.Error as e:
+        print(f"Error loading history: {e}")
+        return [], 0
+
+
+def list_history_pdfs(user_id=None):
+    """Distinct PDF names in a user's history, for filter dropdowns"""
+    where, params = _user_clause(user_id)
+    try:
+        rows = _connection().execute(
+            f"SELECT DISTINCT pdf_name FROM history WHERE {where} AND pdf_name != '' ORDER BY pdf_name",
+            params,
+        ).fetchall()
+        return [row["pdf_name"] for row in rows]
+    except sqlite3.Error as e:
+        print(f"Error loading history: {e}")
+        return []
@@ -0,0 +1,112 @@
+import threading
+import numpy as np
+from backend.embedding_provider import embedding_provider
+from backend.history_manager import (
+    get_history_since, get_history_items, save_history_embeddings, SHARED_USER_ID,
+)
+
+# Past questions at least this similar (cosine) are offered as matches
+SIMILAR_QUESTION_THRESHOLD = 0.6
+# Items pulled from SQLite (and encoded, if needed) per refresh step
+REFRESH_BATCH_SIZE = 1000
+
+
+class HistorySearch:
+    """
+    "Find a similar past question" over search history. Question embeddings
+    live in one in-memory matrix, so a lookup is a single matrix-vector
+    product even with tens of thousands of items. New items are pulled from
+    SQLite incrementally; items stored without an embedding are encoded
+    once with the shared MiniLM model and written back.
+    """
+
+    def __init__(self, batch_size=REFRESH_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._ids = np.empty(0, dtype="int64")
+        self._user_ids = np.empty(0, dtype=object)
+        self._pdf_names = np.empty(0, dtype=object)
+        self._doc_ids = np.empty(0, dtype=object)
+        self._vectors = None
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Load items added since the last refresh"""
+        with self._lock:
+            while True:
+                rows = get_history_since(self._last_id, limit=self.batch_size)
+                if not rows:
+                    return
+                # Vectors from another embedding model (or never computed) are re-encoded
+                dim = embedding_provider.dimension
+                missing = [
+                    row for row in rows
+                    if row["embedding"] is None or row["embedding"].shape[0] != dim
+                ]
+                if missing:
+                    vectors = embedding_provider.encode([row["question"] for row in missing])
+                    for row, vector in zip(missing, vectors):
+                        row["embedding"] = vector
+                    save_history_embeddings({row["id"]: row["embedding"] for row in missing})
+                self._append(rows)
+                self._last_id = rows[-1]["id"]
+                if len(rows) < self.batch_size:
+                    return
+
+    def _append(self, rows):
+        vectors = np.vstack([row["embedding"] for row in rows]).astype("float32")
+        self._vectors = vectors if self._vectors is None else np.vstack([self._vectors, vectors])
+        self._ids = np.concatenate([self._ids, np.array([row["id"] for row in rows], dtype="int64")])
+        self._user_ids = np.concatenate([self._user_ids, np.array([row["user_id"] for row in rows], dtype=object)])
+        self._pdf_names = np.concatenate([self._pdf_names, np.array([row["pdf_name"] for row in rows], dtype=object)])
+        self._doc_ids = np.concatenate([self._doc_ids, np.array([row["doc_id"] for row in rows], dtype=object)])
+
+    def find_similar(self, query, user_id=None, k=5, pdf_name=None,
+                     min_score=SIMILAR_QUESTION_THRESHOLD, query_embedding=None, doc_id=None):
+        """
+        Past questions closest to query, best first, each a history item
+        with a "similarity" score. Pass query_embedding when the caller has
+        already encoded the query. doc_id restricts matches to answers about
+        the same document content, whatever its file name.
+        """
+        self.refresh()
+        with self._lock:
+            ids, user_ids, pdf_names, doc_ids, vectors = (
+                self._ids, self._user_ids, self._pdf_names, self._doc_ids, self._vectors
+            )
+        if vectors is None:
+            return []
+
+        if query_embedding is None:
+            query_embedding = embedding_provider.encode_query(query)
+        scores = vectors @ np.asarray(query_embedding, dtype="float32").reshape(-1)
+
+        mask = scores >= min_score
+        if user_id is not None:
+            mask &= (user_ids == user_id) | (user_ids == SHARED_USER_ID)
+        if pdf_name:
+            mask &= pdf_names == pdf_name
+        if doc_id:
+            mask &= doc_ids == doc_id
+        candidates = np.flatnonzero(mask)
+        if candidates.size == 0:
+            return []
+
+        # Over-fetch a little: items pruned or cleared since loading are dropped below
+        top = min(candidates.size, k * 2)
+        best = candidates[np.argpartition(-scores[candidates], top - 1)[:top]]
+        best = best[np.argsort(-scores[best])]
+        items = get_history_items([int(i) for i in ids[best]])
+
+        results = []
+        for index in best:
+            item = items.get(int(ids[index]))
+            if item is not None:
+                results.append(dict(item, similarity=float(scores[index])))
+            if len(results) == k:
+                break
+        return results
+
+
+# Singleton instance
+history_search = HistorySearch()
@@ -0,0 +1,241 @@
+import os
+import math
+import time
+import faiss
+import numpy as np
+
+# "auto" picks a type from the corpus size; or force one of INDEX_TYPES
+INDEX_TYPE = os.environ.get("STUDYMATE_INDEX_TYPE", "auto")
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+# Exact search is fast enough below this many vectors
+FLAT_MAX_VECTORS = 50_000
+# Above this IVF-Flat memory gets too large and vectors are compressed with PQ
+IVF_FLAT_MAX_VECTORS = 1_000_000
+
+TRAIN_SAMPLE_SIZE = 65_536
+# FAISS warns below ~39 training points per centroid
+MIN_POINTS_PER_CENTROID = 39
+
+IVF_NPROBE = int(os.environ.get("STUDYMATE_IVF_NPROBE", "16"))
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = int(os.environ.get("STUDYMATE_HNSW_EF_SEARCH", "64"))
+PQ_BITS = 8
+
+
+def choose_index_type(num_vectors, index_type=None):
+    """Resolve the configured index type ("auto" by default) for a corpus size"""
+    index_type = index_type or INDEX_TYPE
+    if index_type != "auto":
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {index_type}")
+        return index_type
+    if num_vectors < FLAT_MAX_VECTORS:
+        return "flat"
+    if num_vectors < IVF_FLAT_MAX_VECTORS:
+        return "ivf_flat"
+    return "ivf_pq"
+
+
+def _nlist_for(num_vectors):
+    """About 4*sqrt(n) lists, capped so every list gets enough training points"""
+    nlist = int(4 * math.sqrt(max(num_vectors, 1)))
+    # Training sees at most TRAIN_SAMPLE_SIZE vectors, however large the corpus
+    training_points = min(num_vectors, TRAIN_SAMPLE_SIZE)
+    nlist = min(nlist, max(1, training_points // MIN_POINTS_PER_CENTROID))
+    return max(1, min(nlist, 65_536))
+
+
+def _min_training_points(index_type):
+    """Fewest training vectors an index type can be trained on"""
+    if index_type == "ivf_pq":
+        # Every PQ codebook has 2**PQ_BITS centroids
+        return max(MIN_POINTS_PER_CENTROID, 2 ** PQ_BITS)
+    if index_type == "ivf_flat":
+        return MIN_POINTS_PER_CENTROID
+    return 0
+
+
+def _pq_subquantizers(dim):
+    """Largest common sub-quantizer count that divides the dimension (48 for MiniLM's 384)"""
+    for m in (64, 48, 32, 24, 16, 8, 4, 2, 1):
+        if dim % m == 0 and dim // m >= 4:
+            return m
+    return 1
+
+
+def create_index(dim, num_vectors, index_type=None, allow_fallback=True):
+    """
+    Create an empty inner-product index suited to num_vectors.
+    IVF indexes still need train_index() before vectors can be added.
+
+    A forced IVF/PQ type that num_vectors is too small to train falls back
+    to an exact flat index (small PDFs are fast to scan anyway), unless
+    allow_fallback is False, in which case ValueError is raised.
+    """
+    index_type = choose_index_type(num_vectors, index_type)
+    training_points = min(num_vectors, TRAIN_SAMPLE_SIZE)
+    if training_points < _min_training_points(index_type):
+        message = (f"{index_type} needs at least {_min_training_points(index_type)} "
+                   f"vectors to train, got {training_points}")
+        if not allow_fallback:
+            raise ValueError(message)
+        print(f"{message}; using a flat index")
+        index_type = "flat"
+
+    if index_type == "flat":
+        return faiss.IndexFlatIP(dim)
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+        return index
+
+    nlist = _nlist_for(num_vectors)
+    quantizer = faiss.IndexFlatIP(dim)
+    if index_type == "ivf_flat":
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+    else:
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_subquantizers(dim), PQ_BITS,
+                                 faiss.METRIC_INNER_PRODUCT)
+    index.nprobe = min(IVF_NPROBE, nlist)
+    return index
+
+
+def train_index(index, embeddings, sample_size=TRAIN_SAMPLE_SIZE, seed=1234):
+    """Train an untrained index on a random sample of the embeddings"""
+    if index.is_trained:
+        return index
+    if len(embeddings) > sample_size:
+        rng = np.random.default_rng(seed)
+        rows = np.sort(rng.choice(len(embeddings), sample_size, replace=False))
+        embeddings = embeddings[rows]
+    index.train(np.ascontiguousarray(embeddings, dtype="float32"))
+    return index
+
+
+def configure_search(index, nprobe=None, ef_search=None):
+    """Apply search-time parameters, e.g. after an index is read back from disk"""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe or IVF_NPROBE, ivf.nlist)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = ef_search or HNSW_EF_SEARCH
+    return index
+
+
+def build_index(embeddings, index_type=None, allow_fallback=True):
+    """Create, train and fill an index from a full embedding matrix"""
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    index = create_index(embeddings.shape[1], len(embeddings), index_type, allow_fallback)
+    train_index(index, embeddings)
+    index.add(embeddings)
+    return index
+
+
+def _index_size_bytes(index):
+    return int(faiss.serialize_index(index).size)
+
+
+def benchmark_index_types(embeddings, queries=None, k=10, index_types=INDEX_TYPES,
+                          num_queries=1000, seed=1234):
+    """
+    Compare recall@k and latency of each index type against the exact flat index.
+
+    Queries default to a random sample of the embeddings themselves. Returns
+    one dict per index type with recall_at_k, mean per-query latency in
+    milliseconds, build time in seconds and serialized size in bytes.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    if queries is None:
+        rng = np.random.default_rng(seed)
+        rows = rng.choice(len(embeddings), min(num_queries, len(embeddings)), replace=False)
+        queries = embeddings[rows]
+    queries = np.ascontiguousarray(queries, dtype="float32")
+    k = min(k, len(embeddings))
+
+    baseline = faiss.IndexFlatIP(embeddings.shape[1])
+    baseline.add(embeddings)
+    _, truth = baseline.search(queries, k)
+
+    report = []
+    for index_type in index_types:
+        started = time.perf_counter()
+        try:
+            # No silent flat fallback here: the row must measure the type it names
+            index = build_index(embeddings, index_type, allow_fallback=False)
+        except (RuntimeError, ValueError) as e:
+            # e.g. too few vectors to train PQ codebooks
+            report.append({"index_type": index_type, "error": str(e), "k": k})
+            continue
+        build_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        _, found = index.search(queries, k)
+        search_seconds = time.perf_counter() - started
+
+        hits = sum(len(set(truth[row]) & set(found[row])) for row in range(len(queries)))
+        report.append({
+            "index_type": index_type,
+            "recall_at_k": hits / float(len(queries) * k),
+            "latency_ms": 1000.0 * search_seconds / len(queries),
+            "build_seconds": build_seconds,
+            "size_bytes": _index_size_bytes(index),
+            "k": k,
+        })
+    return report
+
+
+def get_index_vectors(index):
+    """
+    Read the stored vectors back out of an index, or None when the index
+    type cannot reconstruct them (PQ codes are lossy and are not returned).
+    """
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype="float32")
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        if isinstance(ivf, faiss.IndexIVFPQ):
+            return None
+        ivf.make_direct_map()
+    try:
+        return index.reconstruct_n(0, index.ntotal)
+    except RuntimeError:
+        return None
+
+
+def format_benchmark(report):
+    """Render a benchmark_index_types() report as a plain-text table"""
+    lines = [f"{'index':<10} {'recall@k':>9} {'ms/query':>9} {'build s':>8} {'size MiB':>9}"]
+    for row in report:
+        if "error" in row:
+            lines.append(f"{row['index_type']:<10} failed: {row['error']}")
+            continue
+        lines.append(
+            f"{row['index_type']:<10} {row['recall_at_k']:>9.3f} {row['latency_ms']:>9.3f} "
+            f"{row['build_seconds']:>8.2f} {row['size_bytes'] / 2**20:>9.1f}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # python -m backend.index_factory <index key> [k]
+    # Prints recall@k and latency of every index type over a stored index's vectors
+    import sys
+    from backend.index_store import load_index
+    from backend.embedding_provider import embedding_provider
+
+    if len(sys.argv) not in (2, 3):
+        sys.exit("usage: python -m backend.index_factory <index key> [k]")
+    entry = load_index(sys.argv[1], mmap=False)
+    if entry is None:
+        sys.exit(f"No stored index with key {sys.argv[1]}")
+    vectors = get_index_vectors(entry["index"])
+    if vectors is None:
+        # PQ codes are lossy; re-encode the chunks for an exact baseline
+        vectors = embedding_provider.encode(entry["chunks"])
+    k = int(sys.argv[2]) if len(sys.argv) == 3 else 10
+    print(f"{entry['metadata'].get('pdf_name', sys.argv[1])}: {len(vectors)} vectors, k={k}")
+    print(format_benchmark(benchmark_index_types(vectors, k=k)))
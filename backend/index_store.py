@@ -0,0 +1,280 @@
+import hashlib
+import json
+import os
+import datetime
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+import faiss
+from backend.pdf_loader import iter_pages, iter_chunks, get_page_count
+from backend.embeddings import build_faiss_index, clear_checkpoint
+from backend.embedding_provider import embedding_provider
+from backend.index_factory import INDEX_TYPE, configure_search
+from backend.transcript_store import iter_transcript_chunks, TRANSCRIPT_CHUNK_WORDS, TRANSCRIPT_CHUNK_OVERLAP
+
+INDEX_DIR = "data/index"
+INDEX_FORMAT_VERSION = 2
+
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.json"
+CHUNK_META_FILE = "chunk_meta.json"
+TEXT_FILE = "text.txt"
+META_FILE = "meta.json"
+
+# One lock per index key, so concurrent sessions never build the same entry twice
+_build_locks = {}
+_build_locks_guard = threading.Lock()
+
+
+def _ensure_index_dir():
+    """Make sure the index directory exists (older checkouts ship an empty file here)"""
+    if os.path.isfile(INDEX_DIR):
+        os.remove(INDEX_DIR)
+    os.makedirs(INDEX_DIR, exist_ok=True)
+
+
+def compute_index_key(pdf_bytes, chunk_size=500, overlap=50, model_name=None, index_type=None):
+    """
+    Build a content-addressed key from the PDF bytes and every parameter
+    that changes the resulting vectors.
+    """
+    model_name = model_name or embedding_provider.model_name
+    digest = hashlib.sha256()
+    digest.update(pdf_bytes)
+    params = {
+        "chunk_size": chunk_size,
+        "overlap": overlap,
+        "model_name": model_name,
+        "index_type": index_type or INDEX_TYPE,
+        "format": INDEX_FORMAT_VERSION,
+    }
+    digest.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def compute_transcript_index_key(record, chunk_size=TRANSCRIPT_CHUNK_WORDS,
+                                 overlap=TRANSCRIPT_CHUNK_OVERLAP, model_name=None, index_type=None):
+    """
+    Content-addressed key for a transcript record: its timed segments plus
+    every parameter that changes the chunks or their vectors.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(record["segments"], sort_keys=True).encode("utf-8"))
+    params = {
+        "kind": "transcript",
+        "chunk_size": chunk_size,
+        "overlap": overlap,
+        "model_name": model_name or embedding_provider.model_name,
+        "index_type": index_type or INDEX_TYPE,
+        "format": INDEX_FORMAT_VERSION,
+    }
+    digest.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _entry_dir(key):
+    return os.path.join(INDEX_DIR, key)
+
+
+def _checkpoint_dir(key):
+    return os.path.join(INDEX_DIR, f"{key}.partial")
+
+
+@contextmanager
+def _build_lock(key):
+    """
+    Serialise builds of one key across sessions (Streamlit sessions are
+    threads of one process). They would otherwise share the key's
+    checkpoint directory while writing it.
+    """
+    with _build_locks_guard:
+        lock = _build_locks.setdefault(key, threading.Lock())
+    with lock:
+        yield
+
+
+def load_index(key, mmap=True):
+    """Load a stored index, its chunks and metadata. Returns None on a cache miss."""
+    entry_dir = _entry_dir(key)
+    index_path = os.path.join(entry_dir, INDEX_FILE)
+    meta_path = os.path.join(entry_dir, META_FILE)
+    if not os.path.exists(index_path) or not os.path.exists(meta_path):
+        return None
+
+    try:
+        index = None
+        if mmap:
+            try:
+                index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError:
+                # Not every index type can be memory-mapped; fall back to a normal read
+                index = None
+        if index is None:
+            index = faiss.read_index(index_path)
+        configure_search(index)
+
+        with open(os.path.join(entry_dir, CHUNKS_FILE), "r") as f:
+            chunks = json.load(f)
+        with open(os.path.join(entry_dir, CHUNK_META_FILE), "r") as f:
+            chunk_meta = json.load(f)
+        with open(os.path.join(entry_dir, TEXT_FILE), "r", encoding="utf-8") as f:
+            text = f.read()
+        with open(meta_path, "r") as f:
+            metadata = json.load(f)
+        return {"key": key, "index": index, "chunks": chunks, "chunk_meta": chunk_meta,
+                "text": text, "metadata": metadata}
+    except Exception as e:
+        print(f"Error loading index {key}: {e}")
+        return None
+
+
+def save_index(key, index, chunks, chunk_meta, text, metadata):
+    """Persist an index entry. Files are written to a temp dir and renamed into place."""
+    _ensure_index_dir()
+    entry_dir = _entry_dir(key)
+    # Unique per call: sessions in one process share a pid
+    tmp_dir = tempfile.mkdtemp(prefix=f"{key}.tmp-", dir=INDEX_DIR)
+
+    faiss.write_index(index, os.path.join(tmp_dir, INDEX_FILE))
+    with open(os.path.join(tmp_dir, CHUNKS_FILE), "w") as f:
+        json.dump(chunks, f)
+    with open(os.path.join(tmp_dir, CHUNK_META_FILE), "w") as f:
+        json.dump(chunk_meta, f)
+    with open(os.path.join(tmp_dir, TEXT_FILE), "w", encoding="utf-8") as f:
+        f.write(text)
+    with open(os.path.join(tmp_dir, META_FILE), "w") as f:
+        json.dump(metadata, f, indent=2)
+
+    try:
+        os.rename(tmp_dir, entry_dir)
+    except OSError:
+        # Another session stored the same key first; its copy is identical
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def get_or_build_index(pdf_path, chunk_size=500, overlap=50, progress_callback=None,
+                       index_type=None):
+    """
+    Return the index entry for a PDF, building and storing it only when
+    this exact content has not been indexed before.
+
+    progress_callback(fraction, message) is called while a new index is
+    built. Encoded batches are checkpointed, so a build that was
+    interrupted resumes instead of starting over.
+    """
+    with open(pdf_path, "rb") as f:
+        pdf_bytes = f.read()
+
+    index_type = index_type or INDEX_TYPE
+    key = compute_index_key(pdf_bytes, chunk_size, overlap, index_type=index_type)
+    entry = load_index(key)
+    if entry:
+        return entry
+
+    with _build_lock(key):
+        # Another session may have finished this build while we waited
+        return load_index(key) or _build_pdf_index(pdf_path, key, chunk_size, overlap,
+                                                   index_type, progress_callback)
+
+
+def _build_pdf_index(pdf_path, key, chunk_size, overlap, index_type, progress_callback):
+    _ensure_index_dir()
+    page_count = get_page_count(pdf_path)
+    # Pages are streamed straight into the chunker and chunks straight into
+    # the encoder, so embedding starts while later pages are still being read
+    page_texts = []
+    chunks, chunk_meta = [], []
+
+    def pages():
+        for page_number, page_text in iter_pages(pdf_path):
+            page_texts.append(page_text)
+            yield page_number, page_text
+
+    def chunk_stream():
+        for chunk in iter_chunks(pages(), chunk_size, overlap):
+            chunks.append(chunk.pop("text"))
+            chunk_meta.append(chunk)
+            yield chunks[-1]
+
+    def on_batch(done, _total):
+        if progress_callback:
+            fraction = len(page_texts) / page_count if page_count else 1.0
+            progress_callback(min(fraction, 1.0), f"Embedded {done} chunks ({len(page_texts)}/{page_count} pages)")
+
+    checkpoint_dir = _checkpoint_dir(key)
+    index, _ = build_faiss_index(chunk_stream(), progress_callback=on_batch,
+                                 checkpoint_dir=checkpoint_dir, index_type=index_type)
+    text = "".join(page_texts)
+
+    metadata = {
+        "pdf_name": os.path.basename(pdf_path),
+        "chunk_size": chunk_size,
+        "overlap": overlap,
+        "model_name": embedding_provider.model_name,
+        "index_type": index_type,
+        "index_class": type(index).__name__,
+        "num_pages": len(page_texts),
+        "num_chunks": len(chunks),
+        "num_chars": len(text),
+        "format": INDEX_FORMAT_VERSION,
+        "created_at": datetime.datetime.now().isoformat(),
+    }
+    save_index(key, index, chunks, chunk_meta, text, metadata)
+    clear_checkpoint(checkpoint_dir)
+    return {"key": key, "index": index, "chunks": chunks, "chunk_meta": chunk_meta,
+            "text": text, "metadata": metadata}
+
+
+def get_or_build_transcript_index(record, chunk_size=TRANSCRIPT_CHUNK_WORDS,
+                                  overlap=TRANSCRIPT_CHUNK_OVERLAP, index_type=None):
+    """
+    Return the index entry for a Whisper transcript record, chunked along
+    its segments (see iter_transcript_chunks) and embedded like a PDF.
+    Each chunk_meta item carries the chunk's "start"/"end" in seconds.
+    Returns None for a transcript without timed segments.
+    """
+    if not record.get("segments"):
+        return None
+
+    index_type = index_type or INDEX_TYPE
+    key = compute_transcript_index_key(record, chunk_size, overlap, index_type=index_type)
+    entry = load_index(key)
+    if entry:
+        return entry
+
+    with _build_lock(key):
+        return load_index(key) or _build_transcript_index(record, key, chunk_size, overlap, index_type)
+
+
+def _build_transcript_index(record, key, chunk_size, overlap, index_type):
+    chunks, chunk_meta = [], []
+    for chunk in iter_transcript_chunks(record["segments"], chunk_size, overlap):
+        chunks.append(chunk.pop("text"))
+        chunk_meta.append(chunk)
+    if not chunks:
+        return None
+
+    checkpoint_dir = _checkpoint_dir(key)
+    index, _ = build_faiss_index(chunks, checkpoint_dir=checkpoint_dir, index_type=index_type)
+
+    metadata = {
+        "source_id": record.get("source_id"),
+        "whisper_model": record.get("model"),
+        "language": record.get("language"),
+        "chunk_size": chunk_size,
+        "overlap": overlap,
+        "model_name": embedding_provider.model_name,
+        "index_type": index_type,
+        "index_class": type(index).__name__,
+        "num_segments": len(record["segments"]),
+        "num_chunks": len(chunks),
+        "num_chars": len(record["text"]),
+        "duration": record["segments"][-1]["end"],
+        "format": INDEX_FORMAT_VERSION,
+        "created_at": datetime.datetime.now().isoformat(),
+    }
+    save_index(key, index, chunks, chunk_meta, record["text"], metadata)
+    clear_checkpoint(checkpoint_dir)
+    return {"key": key, "index": index, "chunks": chunks, "chunk_meta": chunk_meta,
+            "text": record["text"], "metadata": metadata}
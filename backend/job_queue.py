@@ -0,0 +1,101 @@
+import os
+import re
+import json
+import uuid
+import datetime
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_DIR = "data/quizzes/jobs"
+JOB_WORKERS = int(os.environ.get("STUDYMATE_JOB_WORKERS", "2"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+JOB_ID_PATTERN = re.compile(r"[0-9a-f]{12}")
+
+
+class JobQueue:
+    """
+    Runs long generation jobs on a background thread pool. Every status
+    change is written to data/quizzes/jobs/job_<id>.json, so any session
+    (or the same user after a browser refresh) can poll a job by id.
+    """
+
+    def __init__(self, job_dir=JOB_DIR, max_workers=JOB_WORKERS):
+        self.job_dir = job_dir
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="studymate-job")
+        self._lock = threading.Lock()
+        os.makedirs(self.job_dir, exist_ok=True)
+        self._recover_interrupted()
+
+    def _job_path(self, job_id):
+        return os.path.join(self.job_dir, f"job_{job_id}.json")
+
+    def _write(self, job):
+        path = self._job_path(job["job_id"])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(job, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def _update(self, job_id, **changes):
+        with self._lock:
+            job = self.get(job_id) or {"job_id": job_id}
+            job.update(changes, updated_at=datetime.datetime.now().isoformat())
+            self._write(job)
+            return job
+
+    def _recover_interrupted(self):
+        """Jobs that were queued or running when the process stopped will never finish"""
+        for name in os.listdir(self.job_dir):
+            if not name.startswith("job_") or not name.endswith(".json"):
+                continue
+            job = self.get(name[len("job_"):-len(".json")])
+            if job and job.get("status") in (QUEUED, RUNNING):
+                self._update(job["job_id"], status=FAILED, error="Interrupted by a server restart")
+
+    def submit(self, kind, func, *args, description="", **kwargs):
+        """Queue func(*args, **kwargs); its return value must be JSON-serialisable"""
+        job_id = uuid.uuid4().hex[:12]
+        now = datetime.datetime.now().isoformat()
+        with self._lock:
+            self._write({
+                "job_id": job_id,
+                "kind": kind,
+                "description": description,
+                "status": QUEUED,
+                "result": None,
+                "error": None,
+                "created_at": now,
+                "updated_at": now,
+            })
+        self._executor.submit(self._run, job_id, func, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, func, args, kwargs):
+        self._update(job_id, status=RUNNING, started_at=datetime.datetime.now().isoformat())
+        try:
+            result = func(*args, **kwargs)
+            self._update(job_id, status=DONE, result=result)
+        except Exception as e:
+            traceback.print_exc()
+            self._update(job_id, status=FAILED, error=str(e))
+
+    def get(self, job_id):
+        """Return the persisted job record, or None if the id is unknown"""
+        # Ids arrive from URL query parameters; never let them name other files
+        if not JOB_ID_PATTERN.fullmatch(str(job_id)):
+            return None
+        try:
+            with open(self._job_path(job_id), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+
+# Singleton instance
+job_queue = JobQueue()
@@ -0,0 +1,210 @@
+import os
+import json
+import bisect
+import datetime
+import threading
+from contextlib import contextmanager
+import faiss
+from backend.embedding_provider import embedding_provider
+from backend.index_factory import get_index_vectors, configure_search, HNSW_M, HNSW_EF_SEARCH
+from backend.index_store import INDEX_DIR, get_or_build_index, load_index
+
+LIBRARY_DIR = os.path.join(INDEX_DIR, "library")
+LIBRARY_INDEX_FILE = "library.faiss"
+LIBRARY_DOCS_FILE = "documents.json"
+LIBRARY_LOCK_FILE = "library.lock"
+
+# Documents are only ever appended, so the library needs an index that can
+# grow without retraining: exact "flat" or graph-based "hnsw"
+LIBRARY_INDEX_TYPE = os.environ.get("STUDYMATE_LIBRARY_INDEX_TYPE", "flat")
+
+
+class LibraryIndex:
+    """
+    One index over every uploaded PDF. Vector ids are assigned in upload
+    order, so each document owns one contiguous id range; chunk texts and
+    page numbers are read from that document's entry in the index store.
+
+    Additions hold an exclusive lock on library.lock, so several server
+    processes can share one library. Where fcntl is unavailable (Windows)
+    only the in-process lock applies and a single process is supported.
+    """
+
+    def __init__(self, library_dir=LIBRARY_DIR, index_type=LIBRARY_INDEX_TYPE):
+        self.library_dir = library_dir
+        self.index_type = index_type
+        self.index = None
+        self.documents = {}      # doc_id -> {"pdf_name", "start", "count", "added_at"}
+        self._starts = []        # sorted id range starts, for id -> document lookup
+        self._start_docs = []    # doc_id owning each entry of _starts
+        self._chunk_cache = {}   # doc_id -> (chunks, chunk_meta)
+        self._loaded_mtime = None
+        self._lock = threading.RLock()
+
+    # ----------------- Persistence -----------------
+    def _paths(self):
+        return (os.path.join(self.library_dir, LIBRARY_INDEX_FILE),
+                os.path.join(self.library_dir, LIBRARY_DOCS_FILE))
+
+    def _new_index(self, dim):
+        if self.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+            return index
+        return faiss.IndexFlatIP(dim)
+
+    def _rebuild_lookup(self):
+        ordered = sorted((doc["start"], doc_id) for doc_id, doc in self.documents.items())
+        self._starts = [start for start, _ in ordered]
+        self._start_docs = [doc_id for _, doc_id in ordered]
+
+    @contextmanager
+    def _process_lock(self):
+        """Serialise read-modify-write of the library files across processes"""
+        try:
+            import fcntl
+        except ImportError:
+            yield
+            return
+        os.makedirs(self.library_dir, exist_ok=True)
+        with open(os.path.join(self.library_dir, LIBRARY_LOCK_FILE), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _reload_if_changed(self):
+        """Pick up documents added by other sessions or processes"""
+        index_path, docs_path = self._paths()
+        if not os.path.exists(docs_path):
+            return
+        mtime = os.path.getmtime(docs_path)
+        if mtime == self._loaded_mtime:
+            return
+        with open(docs_path, "r") as f:
+            self.documents = json.load(f)
+        self.index = configure_search(faiss.read_index(index_path))
+        self._rebuild_lookup()
+        self._loaded_mtime = mtime
+
+    def _save(self):
+        os.makedirs(self.library_dir, exist_ok=True)
+        index_path, docs_path = self._paths()
+        faiss.write_index(self.index, f"{index_path}.tmp")
+        os.replace(f"{index_path}.tmp", index_path)
+        # documents.json is replaced last; readers key their reload off it
+        with open(f"{docs_path}.tmp", "w") as f:
+            json.dump(self.documents, f, indent=2)
+        os.replace(f"{docs_path}.tmp", docs_path)
+        self._loaded_mtime = os.path.getmtime(docs_path)
+
+    # ----------------- Documents -----------------
+    def has_document(self, doc_id):
+        with self._lock:
+            self._reload_if_changed()
+            return doc_id in self.documents
+
+    def list_documents(self):
+        with self._lock:
+            self._reload_if_changed()
+            return [dict(doc, doc_id=doc_id) for doc_id, doc in self.documents.items()]
+
+    def add_document(self, entry):
+        """
+        Append an index-store entry to the library. Vectors are copied out
+        of the document's own index, so nothing already in the library is
+        re-embedded. Returns False when the document is already present.
+        """
+        doc_id = entry["key"]
+        with self._lock, self._process_lock():
+            # Reloaded under the file lock so another process's additions are kept
+            self._reload_if_changed()
+            if doc_id in self.documents:
+                return False
+
+            vectors = get_index_vectors(entry["index"])
+            if vectors is None:
+                # Lossy (PQ) document index: encode just this document's chunks
+                vectors = embedding_provider.encode(entry["chunks"])
+            if self.index is None:
+                self.index = self._new_index(vectors.shape[1])
+
+            start = self.index.ntotal
+            self.index.add(vectors)
+            self.documents[doc_id] = {
+                "pdf_name": entry["metadata"].get("pdf_name", ""),
+                "start": start,
+                "count": len(vectors),
+                "added_at": datetime.datetime.now().isoformat(),
+            }
+            self._chunk_cache[doc_id] = (entry["chunks"], entry.get("chunk_meta"))
+            self._rebuild_lookup()
+            self._save()
+            return True
+
+    def add_pdf(self, pdf_path, progress_callback=None):
+        """Index a PDF (reusing the stored index when there is one) and add it"""
+        entry = get_or_build_index(pdf_path, progress_callback=progress_callback)
+        self.add_document(entry)
+        return entry
+
+    def _chunks_for(self, doc_id):
+        if doc_id not in self._chunk_cache:
+            entry = load_index(doc_id)
+            self._chunk_cache[doc_id] = (entry["chunks"], entry.get("chunk_meta")) if entry else ([], None)
+        return self._chunk_cache[doc_id]
+
+    def _locate(self, vector_id):
+        position = bisect.bisect_right(self._starts, vector_id) - 1
+        return self._start_docs[position], vector_id - self._starts[position]
+
+    # ----------------- Search -----------------
+    def _search_params(self, doc_id):
+        doc = self.documents.get(doc_id)
+        if doc is None:
+            raise KeyError(f"Unknown document: {doc_id}")
+        selector = faiss.IDSelectorRange(doc["start"], doc["start"] + doc["count"])
+        if isinstance(self.index, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=HNSW_EF_SEARCH)
+        return faiss.SearchParameters(sel=selector)
+
+    def search(self, query_embeddings, k=3, doc_id=None):
+        """
+        Search the whole library, or one document when doc_id is given.
+        Returns one list of hit dicts per query row.
+        """
+        with self._lock:
+            self._reload_if_changed()
+            if self.index is None or self.index.ntotal == 0:
+                return [[] for _ in range(len(query_embeddings))]
+
+            if doc_id is None:
+                scores, ids = self.index.search(query_embeddings, k)
+            else:
+                scores, ids = self.index.search(query_embeddings, k, params=self._search_params(doc_id))
+
+            results = []
+            for row_scores, row_ids in zip(scores, ids):
+                hits = []
+                for score, vector_id in zip(row_scores, row_ids):
+                    if vector_id == -1:
+                        continue
+                    hit_doc, chunk_id = self._locate(int(vector_id))
+                    chunks, chunk_meta = self._chunks_for(hit_doc)
+                    if chunk_id >= len(chunks):
+                        continue
+                    hits.append({
+                        "doc_id": hit_doc,
+                        "pdf_name": self.documents[hit_doc]["pdf_name"],
+                        "chunk_id": chunk_id,
+                        "page": chunk_meta[chunk_id]["page"] if chunk_meta else None,
+                        "text": chunks[chunk_id],
+                        "score": float(score),
+                    })
+                results.append(hits)
+            return results
+
+
+# Singleton instance
+library_index = LibraryIndex()
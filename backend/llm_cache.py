@@ -0,0 +1,125 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from backend.db import Database
+
+LLM_CACHE_PATH = os.environ.get("STUDYMATE_LLM_CACHE_PATH", "data/llm_cache.sqlite3")
+LLM_CACHE_ENABLED = os.environ.get("STUDYMATE_LLM_CACHE", "1") != "0"
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("STUDYMATE_LLM_CACHE_MAX_ENTRIES", "5000"))
+LLM_CACHE_MAX_AGE_SECONDS = float(os.environ.get("STUDYMATE_LLM_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache(last_used);
+"""
+
+
+def make_cache_key(model, prompt, options=None):
+    """Key on the model, a hash of the prompt and the sampling options"""
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    options_json = json.dumps(options or {}, sort_keys=True)
+    return hashlib.sha256(f"{model}\0{prompt_hash}\0{options_json}".encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Persistent prompt/response cache in SQLite. Entries expire after
+    max_age_seconds and the least recently used ones are evicted once
+    there are more than max_entries.
+    """
+
+    def __init__(self, path=LLM_CACHE_PATH, max_entries=LLM_CACHE_MAX_ENTRIES,
+                 max_age_seconds=LLM_CACHE_MAX_AGE_SECONDS, enabled=LLM_CACHE_ENABLED):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._db = Database(path, SCHEMA)
+        self._counter_lock = threading.Lock()
+
+    def _connect(self):
+        return self._db.connection()
+
+    def _count(self, hit):
+        with self._counter_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, model, prompt, options=None):
+        """Return the cached response, or None on a miss or an expired entry"""
+        if not self.enabled:
+            return None
+        key = make_cache_key(model, prompt, options)
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            now = time.time()
+            if row is None or now - row[1] > self.max_age_seconds:
+                if row is not None:
+                    with conn:
+                        conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._count(hit=False)
+                return None
+            with conn:
+                conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+            self._count(hit=True)
+            return row[0]
+        except sqlite3.Error as e:
+            print(f"LLM cache read failed: {e}")
+            return None
+
+    def put(self, model, prompt, response, options=None):
+        if not self.enabled:
+            return
+        key = make_cache_key(model, prompt, options)
+        now = time.time()
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, model, response, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, model, response, now, now),
+                )
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            print(f"LLM cache write failed: {e}")
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.max_age_seconds,))
+        excess = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key IN "
+                "(SELECT key FROM llm_cache ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache")
+
+    def stats(self):
+        with self._counter_lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {"hits": hits, "misses": misses, "hit_rate": hits / total if total else 0.0}
+
+
+# Singleton instance
+llm_cache = LLMCache()
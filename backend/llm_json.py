@@ -0,0 +1,167 @@
+import re
+import json
+
+_decoder = json.JSONDecoder()
+
+FENCE_PATTERN = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.DOTALL)
+TRAILING_COMMA_PATTERN = re.compile(r",\s*([}\]])")
+QUESTION_START_PATTERN = re.compile(r'\{\s*["“]question["”]\s*:')
+QUIZ_TITLE_PATTERN = re.compile(r'"quiz_title"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+def _strip_trailing_commas(text):
+    """Drop commas right before a closing bracket, leaving string contents alone"""
+    out = []
+    in_string = escaped = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "," and TRAILING_COMMA_PATTERN.match(text, i):
+            continue
+        out.append(ch)
+    return "".join(out)
+
+
+def _repair(text):
+    """
+    Fix the small mistakes models make most often. Curly quotes become
+    straight ones, which also changes them inside string values, so this
+    is only applied to text that does not parse as it is.
+    """
+    text = text.replace("“", '"').replace("”", '"')
+    return _strip_trailing_commas(text)
+
+
+def _object_end(text, start):
+    """End of the brace-balanced object starting at start, or None if it never closes"""
+    depth = 0
+    in_string = escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return None
+
+
+def _candidates(text):
+    """The fenced block if there is one, then the raw text"""
+    match = FENCE_PATTERN.search(text)
+    if match and match.group(1).strip():
+        yield match.group(1)
+    yield text
+
+
+def extract_json_object(text):
+    """Return the first complete JSON object in a model response, or None"""
+    for candidate in _candidates(text):
+        for attempt in (candidate, _repair(candidate)):
+            start = attempt.find("{")
+            while start != -1:
+                try:
+                    obj, _ = _decoder.raw_decode(attempt, start)
+                    if isinstance(obj, dict):
+                        return obj
+                except json.JSONDecodeError:
+                    pass
+                start = attempt.find("{", start + 1)
+    return None
+
+
+def salvage_questions(text):
+    """
+    Recover every complete question object from output that does not
+    parse as a whole, e.g. because generation stopped mid-way through
+    the last question. Each question is decoded from the raw text first;
+    only an object that fails is repaired, on its own.
+    """
+    questions = []
+    position = 0
+    while True:
+        match = QUESTION_START_PATTERN.search(text, position)
+        if not match:
+            break
+        try:
+            obj, end = _decoder.raw_decode(text, match.start())
+        except json.JSONDecodeError:
+            end = _object_end(text, match.start())
+            if end is None:
+                position = match.end()
+                continue
+            obj = None
+            # Curly quotes are only straightened when the commas were not the problem
+            for attempt in (_strip_trailing_commas(text[match.start():end]), _repair(text[match.start():end])):
+                try:
+                    obj = json.loads(attempt)
+                    break
+                except json.JSONDecodeError:
+                    pass
+            if obj is None:
+                position = match.end()
+                continue
+        questions.append(obj)
+        position = end
+    return questions
+
+
+def normalize_question(question):
+    """Lower-case option keys and correct_answer so "A" and "a" mean the same option"""
+    if isinstance(question, dict) and isinstance(question.get("options"), dict):
+        question["options"] = {str(key).strip().lower(): value for key, value in question["options"].items()}
+        if "correct_answer" in question:
+            question["correct_answer"] = str(question["correct_answer"]).strip().lower()
+    return question
+
+
+def is_valid_question(question):
+    return (
+        isinstance(question, dict)
+        and bool(question.get("question"))
+        and isinstance(question.get("options"), dict)
+        and str(question.get("correct_answer", "")).strip().lower()
+        in {str(key).strip().lower() for key in question["options"]}
+    )
+
+
+def parse_quiz_response(text):
+    """
+    Parse a quiz from a model response, salvaging individual questions when
+    the whole object is malformed or truncated. Raises ValueError if no
+    usable question can be recovered.
+    """
+    quiz_data = extract_json_object(text)
+    if quiz_data and isinstance(quiz_data.get("questions"), list):
+        questions = [normalize_question(q) for q in quiz_data["questions"] if is_valid_question(q)]
+        if questions:
+            quiz_data["questions"] = questions
+            return quiz_data
+
+    questions = [normalize_question(q) for q in salvage_questions(text) if is_valid_question(q)]
+    if not questions:
+        raise ValueError("No quiz questions found in model response")
+
+    quiz_data = quiz_data if isinstance(quiz_data, dict) and "questions" in quiz_data else {}
+    title = QUIZ_TITLE_PATTERN.search(text)
+    if title and "quiz_title" not in quiz_data:
+        quiz_data["quiz_title"] = json.loads(f'"{title.group(1)}"')
+    quiz_data["questions"] = questions
+    return quiz_data
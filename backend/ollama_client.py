@@ -1,23 +1,208 @@
+import os
+import json
+import time
+import random
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from backend.llm_cache import llm_cache
 
-OLLAMA_API = "http://localhost:11434/api/generate"
-MODEL_NAME = "granite3.3:2b"   # ✅ set your Ollama model here
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+OLLAMA_API = f"{OLLAMA_HOST.rstrip('/')}/api/generate"
+MODEL_NAME = os.environ.get("OLLAMA_MODEL", "granite3.3:2b")   # ✅ set your Ollama model here
 
-def ask_ollama(prompt: str) -> str:
+# At most this many generations run against the local model server at once,
+# across every Streamlit session in this process
+MAX_CONCURRENT_REQUESTS = int(os.environ.get("STUDYMATE_OLLAMA_MAX_CONCURRENCY", "2"))
+CONNECT_TIMEOUT = float(os.environ.get("STUDYMATE_OLLAMA_CONNECT_TIMEOUT", "5"))
+# Read timeout applies between bytes, so long streamed generations are fine
+READ_TIMEOUT = float(os.environ.get("STUDYMATE_OLLAMA_READ_TIMEOUT", "300"))
+# How long a call waits for a free generation slot before giving up
+QUEUE_TIMEOUT = float(os.environ.get("STUDYMATE_OLLAMA_QUEUE_TIMEOUT", "600"))
+MAX_RETRIES = int(os.environ.get("STUDYMATE_OLLAMA_MAX_RETRIES", "3"))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class OllamaError(Exception):
+    pass
+
+
+class RetryableOllamaError(OllamaError):
+    pass
+
+
+class OllamaClient:
+    """
+    Ollama client with a keep-alive connection pool, per-call timeouts,
+    bounded exponential-backoff retries and a semaphore capping how many
+    generations run at once.
+    """
+
+    def __init__(self, api_url=OLLAMA_API, model=MODEL_NAME, max_concurrency=MAX_CONCURRENT_REQUESTS,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 queue_timeout=QUEUE_TIMEOUT, max_retries=MAX_RETRIES):
+        self.api_url = api_url
+        self.model = model
+        self.timeout = (connect_timeout, read_timeout)
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(max_concurrency, 1) * 2)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _payload(self, prompt, stream, options=None, format=None):
+        payload = {"model": self.model, "prompt": prompt, "stream": stream}
+        if options:
+            payload["options"] = options
+        if format:
+            payload["format"] = format
+        return payload
+
+    def _backoff(self, attempt):
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt))
+        time.sleep(delay * random.uniform(0.5, 1.0))
+
+    def _acquire_slot(self):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise OllamaError("Model server is busy, please try again shortly")
+
+    def _post(self, payload, stream):
+        try:
+            response = self.session.post(self.api_url, json=payload, stream=stream, timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise RetryableOllamaError(str(e)) from e
+        if response.status_code in RETRY_STATUS_CODES:
+            response.close()
+            raise RetryableOllamaError(f"HTTP {response.status_code}")
+        response.raise_for_status()
+        return response
+
+    def generate(self, prompt, options=None, format=None):
+        """Run one blocking generation and return the full response text"""
+        payload = self._payload(prompt, False, options, format)
+        self._acquire_slot()
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = self._post(payload, stream=False)
+                    data = response.json()
+                    if data.get("error"):
+                        raise OllamaError(data["error"])
+                    return data.get("response", "")
+                except (RetryableOllamaError, requests.Timeout) as e:
+                    if attempt == self.max_retries:
+                        raise OllamaError(f"giving up after {attempt + 1} attempts: {e}") from e
+                    self._backoff(attempt)
+        finally:
+            self._slots.release()
+
+    def stream(self, prompt, options=None, format=None, stats=None):
+        """
+        Yield response tokens as they are generated. Failures before the
+        first token are retried; once tokens have been yielded they are not.
+        """
+        payload = self._payload(prompt, True, options, format)
+        started = time.perf_counter()
+        self._acquire_slot()
+        try:
+            for attempt in range(self.max_retries + 1):
+                received = False
+                try:
+                    with self._post(payload, stream=True) as response:
+                        # Ollama streams one JSON object per line
+                        for line in response.iter_lines():
+                            if not line:
+                                continue
+                            data = json.loads(line)
+                            if data.get("error"):
+                                raise OllamaError(data["error"])
+                            token = data.get("response", "")
+                            if token:
+                                if stats is not None and "first_token_seconds" not in stats:
+                                    stats["first_token_seconds"] = time.perf_counter() - started
+                                received = True
+                                yield token
+                            if data.get("done"):
+                                break
+                    return
+                except (RetryableOllamaError, requests.ConnectionError, requests.Timeout) as e:
+                    if received or attempt == self.max_retries:
+                        raise OllamaError(f"stream failed after {attempt + 1} attempts: {e}") from e
+                    self._backoff(attempt)
+        finally:
+            self._slots.release()
+            if stats is not None:
+                stats["total_seconds"] = time.perf_counter() - started
+
+
+# Singleton instance shared by every backend module
+ollama_client = OllamaClient()
+
+def _cache_options(options=None, format=None):
+    """Everything besides the model and prompt that changes the output"""
+    cache_options = dict(options or {})
+    if format:
+        cache_options["format"] = format
+    return cache_options
+
+def stream_ollama(prompt: str, stats: dict = None, use_cache: bool = True, options: dict = None):
+    """
+    Sends a prompt to the Ollama model and yields response tokens as they
+    are generated. If a stats dict is passed, it is filled with
+    first_token_seconds and total_seconds. A cached response is yielded
+    in one piece. A failure ends the stream without an error token, since
+    it can follow partial output: it is recorded as stats["error"] and
+    callers must check that before keeping or showing the text as an answer.
+    """
+    cache_options = _cache_options(options)
+    if use_cache:
+        cached = llm_cache.get(ollama_client.model, prompt, cache_options)
+        if cached is not None:
+            if stats is not None:
+                stats["first_token_seconds"] = stats["total_seconds"] = 0.0
+                stats["cached"] = True
+            yield cached
+            return
+
+    tokens = []
+    try:
+        for token in ollama_client.stream(prompt, options=options, stats=stats):
+            tokens.append(token)
+            yield token
+    except Exception as e:
+        print(f"Ollama stream failed: {e}")
+        if stats is not None:
+            stats["error"] = str(e)
+        return
+
+    if use_cache and tokens:
+        llm_cache.put(ollama_client.model, prompt, "".join(tokens), cache_options)
+
+def ask_ollama(prompt: str, use_cache: bool = True, options: dict = None, format: str = None) -> str:
     """
     Sends a prompt to the Ollama model and returns the response.
+    Identical model/prompt/options calls are answered from the on-disk
+    cache unless use_cache is False.
     """
+    cache_options = _cache_options(options, format)
+    if use_cache:
+        cached = llm_cache.get(ollama_client.model, prompt, cache_options)
+        if cached is not None:
+            return cached
+
     try:
-        response = requests.post(
-            OLLAMA_API,
-            json={
-                "model": MODEL_NAME,
-                "prompt": prompt,
-                "stream": False
-            }
-        )
-        response.raise_for_status()
-        data = response.json()
-        return data.get("response", "⚠️ No response from Ollama")
+        response = ollama_client.generate(prompt, options=options, format=format)
     except Exception as e:
         return f"❌ Ollama Error: {e}"
+
+    if not response:
+        return "⚠️ No response from Ollama"
+    if use_cache:
+        llm_cache.put(ollama_client.model, prompt, response, cache_options)
+    return response
@@ -1,11 +1,144 @@
+import os
+import re
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import fitz  # PyMuPDF
 
-def extract_text_from_pdf(pdf_path):
-    doc = fitz.open(pdf_path)
-    text = ""
-    for page in doc:
-        text += page.get_text("text")
-    return text
+WORD_PATTERN = re.compile(r"\S+")
+
+# Documents shorter than this are extracted in-process; pool start-up costs more than it saves
+PARALLEL_MIN_PAGES = 200
+# Page ranges handed to each worker; small enough that pages stream back in order
+PAGES_PER_TASK = 25
+
+
+_worker_doc = None
+
+
+def _init_extract_worker(pdf_path):
+    """Each pool worker opens its own handle; fitz documents cannot be shared across processes"""
+    global _worker_doc
+    _worker_doc = fitz.open(pdf_path)
+
+
+def _extract_page_range(page_range):
+    start, end = page_range
+    return [(number + 1, _worker_doc[number].get_text("text")) for number in range(start, end)]
+
+
+def _resolve_workers(page_count, workers):
+    if workers is None:
+        workers = (os.cpu_count() or 1) if page_count >= PARALLEL_MIN_PAGES else 1
+    task_count = max(1, -(-page_count // PAGES_PER_TASK))
+    return max(1, min(workers, task_count))
+
+
+def get_page_count(pdf_path):
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+
+def iter_pages(pdf_path, workers=None):
+    """
+    Yield (page_number, text) one page at a time, page numbers starting at 1.
+
+    With more than one worker, page ranges are extracted in a process pool
+    and yielded back in page order, so the output is identical to the
+    serial path. workers=None picks the pool size from the page count.
+    """
+    with fitz.open(pdf_path) as doc:
+        page_count = doc.page_count
+        workers = _resolve_workers(page_count, workers)
+        if workers == 1:
+            for page in doc:
+                yield page.number + 1, page.get_text("text")
+            return
+
+    page_ranges = [
+        (start, min(start + PAGES_PER_TASK, page_count))
+        for start in range(0, page_count, PAGES_PER_TASK)
+    ]
+    # Spawned, not forked: the server process is multithreaded (Streamlit, torch)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_extract_worker, initargs=(pdf_path,),
+                             mp_context=multiprocessing.get_context("spawn")) as executor:
+        # map() returns results in submission order regardless of completion order
+        for pages in executor.map(_extract_page_range, page_ranges):
+            yield from pages
+
+
+def extract_text_from_pdf(pdf_path, workers=None):
+    return "".join(text for _, text in iter_pages(pdf_path, workers))
+
+
+def iter_chunks(pages, chunk_size=500, overlap=50):
+    """
+    Stream (page_number, text) pairs into overlapping word chunks.
+
+    Produces the same chunk texts as chunk_text() on the joined document,
+    but only keeps one chunk worth of words in memory. Each chunk is a dict
+    with its text, the page it starts on and character offsets into the
+    extracted document text.
+    """
+    step = chunk_size - overlap
+    if step <= 0:
+        raise ValueError("overlap must be smaller than chunk_size")
+
+    window = deque()  # (word, page_number, start, end)
+    offset = 0
+
+    def make_chunk():
+        words = list(window)[:chunk_size]
+        return {
+            "text": " ".join(w[0] for w in words),
+            "page": words[0][1],
+            "end_page": words[-1][1],
+            "start": words[0][2],
+            "end": words[-1][3],
+        }
+
+    def add_word(word, page_number, start):
+        window.append((word, page_number, start, start + len(word)))
+        if len(window) == chunk_size:
+            yield make_chunk()
+            for _ in range(step):
+                window.popleft()
+
+    # A word cut off at the end of a page continues on the next one, exactly
+    # as it would in the joined text, so it is held back until the next page
+    pending, pending_page = "", None
+
+    for page_number, page_text in pages:
+        scan = pending + page_text
+        base = offset - len(pending)
+        matches = list(WORD_PATTERN.finditer(scan))
+        held = matches.pop() if matches and not scan[-1].isspace() else None
+
+        for match in matches:
+            word_page = pending_page if pending and match.start() == 0 else page_number
+            yield from add_word(match.group(), word_page, base + match.start())
+
+        if held:
+            pending_page = pending_page if pending and held.start() == 0 else page_number
+            pending = held.group()
+        else:
+            pending, pending_page = "", None
+        offset = base + len(scan)
+
+    if pending:
+        yield from add_word(pending, pending_page, offset - len(pending))
+
+    # Trailing chunks, mirroring range(0, len(words), step) in chunk_text()
+    while window:
+        yield make_chunk()
+        for _ in range(min(step, len(window))):
+            window.popleft()
+
+
+def iter_pdf_chunks(pdf_path, chunk_size=500, overlap=50, workers=None):
+    """Extract and chunk a PDF lazily, page by page"""
+    return iter_chunks(iter_pages(pdf_path, workers), chunk_size, overlap)
+
 
 def chunk_text(text, chunk_size=500, overlap=50):
     words = text.split()
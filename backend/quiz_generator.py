@@ -1,10 +1,14 @@
-import json
-import os
+import re
+import math
 import uuid
 import datetime
-from backend.ollama_client import ask_ollama
+from concurrent.futures import ThreadPoolExecutor
+from backend.ollama_client import ask_ollama, MAX_CONCURRENT_REQUESTS
+from backend.pdf_loader import chunk_text
+from backend.llm_json import parse_quiz_response, is_valid_question
+from backend.quiz_store import quiz_store
 # Add this import at the top
-from backend.youtube_processor import generate_quiz_from_youtube
+from backend.youtube_processor import generate_quiz_from_youtube, format_timestamp
 
 # Add this function to the existing quiz_generator.py
 def create_youtube_quiz(youtube_url, difficulty="medium", num_questions=5):
@@ -32,15 +36,163 @@ def create_youtube_quiz(youtube_url, difficulty="medium", num_questions=5):
         "video_info": quiz_data.get("video_info", {})
     }
     
-    os.makedirs("data/quizzes", exist_ok=True)
-    with open(f"data/quizzes/quiz_{form_id}.json", "w") as f:
-        json.dump(form_info, f, indent=2)
+    quiz_store.save_quiz(form_info)
     
     return form_info, None
 
-def generate_quiz(text, difficulty="medium", num_questions=5):
+# Questions asked of each sampled chunk in the map step
+QUESTIONS_PER_CHUNK = 3
+# Two questions whose word sets overlap this much are treated as duplicates
+DUPLICATE_QUESTION_OVERLAP = 0.8
+
+def select_representative_chunks(chunks, num_chunks, embeddings=None):
+    """
+    Pick num_chunks chunk positions that cover the whole document.
+    With chunk embeddings, chunks closest to k-means centroids are used so
+    every topic is represented; otherwise positions are spread evenly.
+    Returned positions are in document order.
+    """
+    if len(chunks) <= num_chunks:
+        return list(range(len(chunks)))
+    
+    evenly_spaced = [int(i * len(chunks) / num_chunks) for i in range(num_chunks)]
+    if embeddings is None or len(embeddings) != len(chunks):
+        return evenly_spaced
+    
+    import faiss
+    import numpy as np
+    vectors = np.ascontiguousarray(embeddings, dtype="float32")
+    kmeans = faiss.Kmeans(vectors.shape[1], num_chunks, niter=20, seed=1234, spherical=True)
+    kmeans.train(vectors)
+    
+    # Nearest real chunk to each centroid
+    chunk_index = faiss.IndexFlatIP(vectors.shape[1])
+    chunk_index.add(vectors)
+    _, nearest = chunk_index.search(kmeans.centroids, 1)
+    
+    selected = []
+    for position in list(nearest[:, 0]) + evenly_spaced:
+        if position != -1 and int(position) not in selected:
+            selected.append(int(position))
+        if len(selected) == num_chunks:
+            break
+    return sorted(selected)
+
+def _generate_chunk_questions(chunk, difficulty, count):
+    """Map step: ask for a few questions about one chunk"""
+    prompt = f"""
+        IMPORTANT: Generate {count} {difficulty}-level multiple choice questions based EXCLUSIVELY on the following text content.
+        
+        Text content to base questions on:
+        {chunk}
+        
+        Format your response as JSON with this exact structure:
+        {{
+            "questions": [
+                {{
+                    "question": "Specific question based on the text",
+                    "options": {{
+                        "a": "Option A that relates to text",
+                        "b": "Option B that relates to text", 
+                        "c": "Option C that relates to text",
+                        "d": "Option D that relates to text"
+                    }},
+                    "correct_answer": "a",
+                    "explanation": "Brief explanation referencing the specific text content"
+                }}
+            ]
+        }}
+        """
+    try:
+        return parse_quiz_response(ask_ollama(prompt, format="json"))["questions"]
+    except Exception as e:
+        print(f"Chunk question generation failed: {e}")
+        return []
+
+def _question_words(question):
+    return set(re.findall(r"\w+", question.get("question", "").lower()))
+
+def merge_questions(question_groups, num_questions):
+    """
+    Reduce step: drop invalid and near-duplicate questions, then take them
+    round-robin across chunks so the quiz covers the whole document.
     """
-    Generate quiz questions based on the PDF text content
+    seen = []
+    unique_groups = []
+    for group in question_groups:
+        unique = []
+        for question in group:
+            if not is_valid_question(question):
+                continue
+            words = _question_words(question)
+            if any(len(words & other) / max(len(words | other), 1) >= DUPLICATE_QUESTION_OVERLAP for other in seen):
+                continue
+            seen.append(words)
+            unique.append(question)
+        unique_groups.append(unique)
+    
+    merged = []
+    depth = 0
+    while len(merged) < num_questions and any(depth < len(group) for group in unique_groups):
+        for group in unique_groups:
+            if depth < len(group) and len(merged) < num_questions:
+                merged.append(group[depth])
+        depth += 1
+    return merged
+
+def generate_question_groups(chunks, difficulty, num_questions, embeddings=None):
+    """
+    Map step over representative chunks. Returns the chosen chunk positions
+    and, for each, the list of questions generated from that chunk.
+    """
+    num_chunks = min(len(chunks), max(2, math.ceil(num_questions / 2)))
+    # Ask for a little more than needed so deduplication still leaves enough
+    per_chunk = min(QUESTIONS_PER_CHUNK, math.ceil(num_questions / num_chunks) + 1)
+    positions = select_representative_chunks(chunks, num_chunks, embeddings)
+    
+    # The Ollama client's semaphore bounds how many of these actually run at once
+    with ThreadPoolExecutor(max_workers=max(1, MAX_CONCURRENT_REQUESTS)) as executor:
+        question_groups = list(executor.map(
+            lambda position: _generate_chunk_questions(chunks[position], difficulty, per_chunk),
+            positions
+        ))
+    return positions, question_groups
+
+def generate_quiz(text, difficulty="medium", num_questions=5, chunks=None, embeddings=None):
+    """
+    Generate quiz questions based on the PDF text content.
+    
+    Representative chunks are sampled across the whole document and a few
+    questions are generated per chunk concurrently, then deduplicated and
+    merged. chunks/embeddings can be passed from the stored FAISS index to
+    reuse its chunking and pick chunks by topic.
+    """
+    # Limit number of questions to maximum 20
+    num_questions = min(num_questions, 20)
+    
+    if chunks is None:
+        chunks = chunk_text(text)
+    if len(chunks) <= 1:
+        return generate_quiz_single(text, difficulty, num_questions)
+    
+    try:
+        _, question_groups = generate_question_groups(chunks, difficulty, num_questions, embeddings)
+        questions = merge_questions(question_groups, num_questions)
+        if not questions:
+            return generate_quiz_single(text, difficulty, num_questions)
+        
+        return {
+            "quiz_title": "Quiz Based on Document Content",
+            "questions": questions
+        }
+    
+    except Exception as e:
+        print(f"Error generating quiz: {e}")
+        return generate_quiz_single(text, difficulty, num_questions)
+
+def generate_quiz_single(text, difficulty="medium", num_questions=5):
+    """
+    Generate quiz questions from the start of the text in a single prompt
     """
     try:
         # Limit number of questions to maximum 20
@@ -71,30 +223,13 @@ def generate_quiz(text, difficulty="medium", num_questions=5):
         }}
         """
         
-        response = ask_ollama(prompt)
+        response = ask_ollama(prompt, format="json")
         
         try:
-            if '```json' in response:
-                json_str = response.split('```json')[1].split('```')[0].strip()
-            elif '```' in response:
-                json_str = response.split('```')[1].split('```')[0].strip()
-            else:
-                json_str = response.strip()
-                json_start = json_str.find('{')
-                if json_start != -1:
-                    json_str = json_str[json_start:]
-                json_end = json_str.rfind('}')
-                if json_end != -1:
-                    json_str = json_str[:json_end+1]
-            
-            quiz_data = json.loads(json_str)
-            
-            if 'questions' not in quiz_data or not isinstance(quiz_data['questions'], list):
-                raise ValueError("Invalid quiz format")
-                
-            return quiz_data
+            # Salvages complete questions from truncated output before paying for a second generation
+            return parse_quiz_response(response)
             
-        except (json.JSONDecodeError, ValueError) as e:
+        except ValueError as e:
             print(f"JSON parsing failed: {e}")
             return create_quiz_from_text(text, num_questions, difficulty)
             
@@ -109,17 +244,11 @@ def create_quiz_from_text(text, num_questions=5, difficulty="medium"):
         num_questions = min(num_questions, 20)
         
         prompt = f"Analyze this text and create {num_questions} {difficulty}-level multiple choice questions: {text[:3000]}"
-        response = ask_ollama(prompt)
+        response = ask_ollama(prompt, format="json")
         
         try:
-            if '```json' in response:
-                json_str = response.split('```json')[1].split('```')[0].strip()
-            else:
-                json_str = response.strip()
-            
-            quiz_data = json.loads(json_str)
-            return quiz_data
-        except:
+            return parse_quiz_response(response)
+        except ValueError:
             return create_fallback_quiz(num_questions)
             
     except Exception as e:
@@ -167,10 +296,30 @@ def create_quiz(quiz_data, form_title="Generated Quiz"):
         "is_shareable": True
     }
     
-    os.makedirs("data/quizzes", exist_ok=True)
-    with open(f"data/quizzes/quiz_{form_id}.json", "w") as f:
-        json.dump(form_info, f, indent=2)
+    quiz_store.save_quiz(form_info)
+    
+    return form_info
+
+def run_pdf_quiz_job(text, difficulty, num_questions, form_title, index_key=None):
+    """Background job: generate and save a PDF quiz, returning its form info"""
+    from backend.index_store import load_index
+    from backend.index_factory import get_index_vectors
     
+    entry = load_index(index_key) if index_key else None
+    quiz_data = generate_quiz(
+        text, difficulty, num_questions,
+        chunks=entry["chunks"] if entry else None,
+        embeddings=get_index_vectors(entry["index"]) if entry else None
+    )
+    if not quiz_data or 'questions' not in quiz_data:
+        raise RuntimeError("Failed to generate quiz. Please try again.")
+    return create_quiz(quiz_data, form_title)
+
+def run_youtube_quiz_job(youtube_url, difficulty, num_questions):
+    """Background job: generate and save a YouTube quiz, returning its form info"""
+    form_info, error = create_youtube_quiz(youtube_url, difficulty, num_questions)
+    if error:
+        raise RuntimeError(error)
     return form_info
 
 def generate_quiz_html(quiz_data):
@@ -368,7 +517,11 @@ def generate_quiz_html(quiz_data):
     
     correct_answers_js = []
     for i, question in enumerate(quiz_data["questions"]):
-        correct_answers_js.append(f'{{q: "q{i}", correct: "{question["correct_answer"]}", explanation: `{question.get("explanation", "No explanation provided.")}`}}')
+        explanation = question.get("explanation", "No explanation provided.")
+        if question.get("timestamp_url"):
+            # Review links back to the moment in the video the question came from
+            explanation += f' <a href="{question["timestamp_url"]}" target="_blank">▶ Watch at {format_timestamp(question["timestamp"])}</a>'
+        correct_answers_js.append(f'{{q: "q{i}", correct: "{question["correct_answer"]}", explanation: `{explanation}`}}')
     
     html_content += f"""
                     <button type="button" class="submit-btn" onclick="submitQuiz()">
@@ -658,12 +811,9 @@ def generate_quiz_html(quiz_data):
 def evaluate_quiz_responses(form_id, user_answers):
     """Evaluate quiz responses and provide results"""
     try:
-        quiz_file = f"data/quizzes/quiz_{form_id}.json"
-        if not os.path.exists(quiz_file):
+        quiz_data = quiz_store.get_quiz(form_id)
+        if quiz_data is None:
             return None
-            
-        with open(quiz_file, "r") as f:
-            quiz_data = json.load(f)
         
         results = {
             "total_questions": len(quiz_data["questions"]),
@@ -689,12 +839,14 @@ def evaluate_quiz_responses(form_id, user_answers):
                 "user_answer": user_answer,
                 "correct_answer": correct_answer,
                 "is_correct": is_correct,
-                "explanation": question.get("explanation", "No explanation provided.")
+                "explanation": question.get("explanation", "No explanation provided."),
+                "timestamp_url": question.get("timestamp_url")
             })
         
         if results["total_questions"] > 0:
             results["score_percentage"] = (results["correct_answers"] / results["total_questions"]) * 100
         
+        quiz_store.record_attempt(form_id, user_answers, results)
         return results
         
     except Exception as e:
@@ -704,11 +856,7 @@ def evaluate_quiz_responses(form_id, user_answers):
 def load_quiz(quiz_id):
     """Load a quiz by ID"""
     try:
-        quiz_file = f"data/quizzes/quiz_{quiz_id}.json"
-        if os.path.exists(quiz_file):
-            with open(quiz_file, "r") as f:
-                return json.load(f)
-        return None
+        return quiz_store.get_quiz(quiz_id)
     except Exception as e:
         print(f"Error loading quiz: {e}")
         return None
\ No newline at end of file
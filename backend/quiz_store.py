@@ -0,0 +1,206 @@
+import os
+import glob
+import json
+import datetime
+import threading
+from backend.db import Database, DB_PATH
+
+QUIZ_JSON_DIR = "data/quizzes"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quizzes (
+    form_id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    quiz_url TEXT,
+    share_url TEXT,
+    created_at TEXT,
+    is_shareable INTEGER NOT NULL DEFAULT 1,
+    video_info TEXT,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS questions (
+    form_id TEXT NOT NULL REFERENCES quizzes(form_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    question TEXT NOT NULL,
+    options TEXT NOT NULL,
+    correct_answer TEXT NOT NULL,
+    explanation TEXT,
+    extra TEXT,
+    PRIMARY KEY (form_id, position)
+);
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    form_id TEXT NOT NULL REFERENCES quizzes(form_id) ON DELETE CASCADE,
+    answers TEXT NOT NULL,
+    correct_answers INTEGER NOT NULL,
+    total_questions INTEGER NOT NULL,
+    score_percentage REAL NOT NULL,
+    submitted_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_attempts_form_id ON attempts(form_id);
+CREATE INDEX IF NOT EXISTS idx_quizzes_created_at ON quizzes(created_at);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+QUIZ_COLUMNS = ("form_id", "title", "quiz_url", "share_url", "created_at", "is_shareable", "video_info")
+QUESTION_COLUMNS = ("question", "options", "correct_answer", "explanation")
+
+
+class QuizStore:
+    """
+    Quizzes, their questions and every submitted attempt in SQLite.
+    get_quiz() returns the same dict shape the old quiz_<id>.json files had.
+    """
+
+    def __init__(self, path=DB_PATH, json_dir=QUIZ_JSON_DIR):
+        self._db = Database(path, SCHEMA)
+        self.json_dir = json_dir
+        self._migrate_lock = threading.Lock()
+        self.migrate_json_quizzes()
+
+    def _conn(self):
+        return self._db.connection()
+
+    def save_quiz(self, form_info):
+        """Insert or replace a quiz and all of its questions in one transaction"""
+        extra = {k: v for k, v in form_info.items() if k not in QUIZ_COLUMNS and k != "questions"}
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM questions WHERE form_id = ?", (form_info["form_id"],))
+            conn.execute(
+                "INSERT OR REPLACE INTO quizzes "
+                "(form_id, title, quiz_url, share_url, created_at, is_shareable, video_info, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    form_info["form_id"],
+                    form_info.get("title", ""),
+                    form_info.get("quiz_url"),
+                    form_info.get("share_url"),
+                    form_info.get("created_at"),
+                    1 if form_info.get("is_shareable", True) else 0,
+                    json.dumps(form_info["video_info"]) if "video_info" in form_info else None,
+                    json.dumps(extra) if extra else None,
+                ),
+            )
+            conn.executemany(
+                "INSERT INTO questions "
+                "(form_id, position, question, options, correct_answer, explanation, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        form_info["form_id"],
+                        position,
+                        question["question"],
+                        json.dumps(question["options"]),
+                        question["correct_answer"],
+                        question.get("explanation"),
+                        self._extra_json(question),
+                    )
+                    for position, question in enumerate(form_info["questions"])
+                ],
+            )
+        return form_info
+
+    @staticmethod
+    def _extra_json(question):
+        extra = {k: v for k, v in question.items() if k not in QUESTION_COLUMNS}
+        return json.dumps(extra) if extra else None
+
+    def get_quiz(self, form_id):
+        """Look a quiz up by form_id; returns None when it does not exist"""
+        conn = self._conn()
+        quiz = conn.execute("SELECT * FROM quizzes WHERE form_id = ?", (form_id,)).fetchone()
+        if quiz is None:
+            return None
+
+        questions = []
+        for row in conn.execute(
+            "SELECT question, options, correct_answer, explanation, extra "
+            "FROM questions WHERE form_id = ? ORDER BY position",
+            (form_id,),
+        ):
+            question = {
+                "question": row["question"],
+                "options": json.loads(row["options"]),
+                "correct_answer": row["correct_answer"],
+            }
+            if row["explanation"] is not None:
+                question["explanation"] = row["explanation"]
+            if row["extra"]:
+                question.update(json.loads(row["extra"]))
+            questions.append(question)
+
+        form_info = {
+            "form_id": quiz["form_id"],
+            "title": quiz["title"],
+            "questions": questions,
+            "quiz_url": quiz["quiz_url"],
+            "share_url": quiz["share_url"],
+            "created_at": quiz["created_at"],
+            "is_shareable": bool(quiz["is_shareable"]),
+        }
+        if quiz["video_info"] is not None:
+            form_info["video_info"] = json.loads(quiz["video_info"])
+        if quiz["extra"]:
+            form_info.update(json.loads(quiz["extra"]))
+        return form_info
+
+    def record_attempt(self, form_id, answers, results):
+        conn = self._conn()
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO attempts "
+                "(form_id, answers, correct_answers, total_questions, score_percentage, submitted_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    form_id,
+                    json.dumps(answers),
+                    results["correct_answers"],
+                    results["total_questions"],
+                    results["score_percentage"],
+                    datetime.datetime.now().isoformat(),
+                ),
+            )
+        return cursor.lastrowid
+
+    def get_attempts(self, form_id):
+        rows = self._conn().execute(
+            "SELECT * FROM attempts WHERE form_id = ? ORDER BY id", (form_id,)
+        ).fetchall()
+        return [dict(row, answers=json.loads(row["answers"])) for row in rows]
+
+    def migrate_json_quizzes(self):
+        """
+        One-shot import of the legacy data/quizzes/quiz_<id>.json files.
+        A marker row makes later calls a no-op; the JSON files are left in place.
+        """
+        with self._migrate_lock:
+            conn = self._conn()
+            if conn.execute("SELECT 1 FROM store_meta WHERE key = 'json_migrated'").fetchone():
+                return 0
+
+            migrated = 0
+            for path in sorted(glob.glob(os.path.join(self.json_dir, "quiz_*.json"))):
+                try:
+                    with open(path, "r") as f:
+                        form_info = json.load(f)
+                    form_info.setdefault("form_id", os.path.basename(path)[len("quiz_"):-len(".json")])
+                    if self.get_quiz(form_info["form_id"]) is None:
+                        self.save_quiz(form_info)
+                        migrated += 1
+                except (OSError, ValueError, KeyError, TypeError) as e:
+                    print(f"Skipping quiz file {path}: {e}")
+
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO store_meta (key, value) VALUES ('json_migrated', ?)",
+                    (datetime.datetime.now().isoformat(),),
+                )
+            return migrated
+
+
+# Singleton instance
+quiz_store = QuizStore()
@@ -1,18 +1,73 @@
-from sentence_transformers import SentenceTransformer
-import faiss
-import numpy as np
+from backend.embedding_provider import embedding_provider
+from backend.library_index import LibraryIndex
 
-# Load the embedding model once globally
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')  # or any model you prefer
+def retrieve_top_k(query, index, chunks=None, k=3, doc_id=None):
+    # Encode query with the shared model (normalised for inner-product search, LRU cached)
+    query_emb = embedding_provider.encode_query(query)
 
-def retrieve_top_k(query, index, chunks, k=3):
-    # Encode query
-    query_emb = embedding_model.encode([query], convert_to_numpy=True)
-    faiss.normalize_L2(query_emb)
+    # Library-wide search: chunks come from the library, optionally limited to one document
+    if isinstance(index, LibraryIndex):
+        return [hit["text"] for hit in index.search(query_emb, k, doc_id=doc_id)[0]]
 
     # Search FAISS index
     D, I = index.search(query_emb, k)
 
-    # Return top-k chunks
-    results = [chunks[i] for i in I[0]]
+    # Return top-k chunks (FAISS pads with -1 when the index has fewer than k vectors)
+    results = [chunks[i] for i in I[0] if i != -1]
+    return results
+
+
+def retrieve_from_library(query, library, k=3, doc_id=None):
+    """Like retrieve_top_k on a library, but returns hits with document name, page and score"""
+    query_emb = embedding_provider.encode_query(query)
+    return library.search(query_emb, k, doc_id=doc_id)[0]
+
+
+def retrieve_from_entry(query_emb, entry, k=3):
+    """
+    Search one document through its own stored index, so the query costs
+    what that document's index type costs rather than a library scan.
+    Returns hits shaped like LibraryIndex.search, with page numbers.
+    """
+    D, I = entry["index"].search(query_emb, k)
+    chunk_meta = entry.get("chunk_meta")
+    hits = []
+    for score, chunk_id in zip(D[0], I[0]):
+        if chunk_id == -1:
+            continue
+        hits.append({
+            "doc_id": entry["key"],
+            "pdf_name": entry["metadata"].get("pdf_name", ""),
+            "chunk_id": int(chunk_id),
+            "page": chunk_meta[chunk_id].get("page") if chunk_meta else None,
+            "text": entry["chunks"][chunk_id],
+            "score": float(score),
+        })
+    return hits
+
+
+def retrieve_batch(queries, index, chunks, k=3, batch_size=None, chunk_meta=None):
+    """
+    Retrieve top-k chunks for many queries against one index.
+
+    Queries are encoded in batches and each batch is answered by a single
+    vectorised index.search call. Returns one list per query of dicts with
+    chunk_id, text, score and, when chunk_meta is given, the chunk's page
+    and character offsets.
+    """
+    batch_size = batch_size or embedding_provider.batch_size
+    results = []
+    for start in range(0, len(queries), batch_size):
+        query_embs = embedding_provider.encode(queries[start:start + batch_size], batch_size=batch_size)
+        D, I = index.search(query_embs, k)
+        for row_scores, row_ids in zip(D, I):
+            hits = []
+            for score, chunk_id in zip(row_scores, row_ids):
+                if chunk_id == -1:
+                    continue
+                hit = {"chunk_id": int(chunk_id), "text": chunks[chunk_id], "score": float(score)}
+                if chunk_meta:
+                    hit.update(chunk_meta[chunk_id])
+                hits.append(hit)
+            results.append(hits)
     return results
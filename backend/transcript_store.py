@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import datetime
+import tempfile
+
+TRANSCRIPT_DIR = "data/transcripts"
+TRANSCRIPT_FORMAT_VERSION = 1
+# Key used when Whisper detected the language itself
+AUTO_LANGUAGE = "auto"
+
+# Transcript chunks are smaller than PDF chunks so a question's timestamp
+# lands within a minute or two of the passage it was asked about
+TRANSCRIPT_CHUNK_WORDS = 250
+TRANSCRIPT_CHUNK_OVERLAP = 25
+
+
+def compute_transcript_key(source_id, model_name, language=None):
+    """
+    Content-addressed key for one transcription: the source (a YouTube video
+    id or an audio file hash), the Whisper model and the requested language.
+    """
+    params = {
+        "source_id": source_id,
+        "model_name": model_name,
+        "language": language or AUTO_LANGUAGE,
+        "format": TRANSCRIPT_FORMAT_VERSION,
+    }
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def compute_file_source_id(audio_path):
+    """Source id for a local audio file, so identical files share a transcript"""
+    digest = hashlib.sha256()
+    with open(audio_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return f"file-{digest.hexdigest()}"
+
+
+def iter_transcript_chunks(segments, chunk_size=TRANSCRIPT_CHUNK_WORDS, overlap=TRANSCRIPT_CHUNK_OVERLAP):
+    """
+    Group consecutive Whisper segments into chunks of about chunk_size
+    words. Segments are never split, so every chunk maps back to a time
+    range: each is a dict with its text, "start"/"end" in seconds and the
+    indexes of its first and last segment. The next chunk repeats the
+    trailing segments that make up at least overlap words.
+    """
+    if overlap >= chunk_size:
+        raise ValueError("overlap must be smaller than chunk_size")
+
+    word_counts = [len(s["text"].split()) for s in segments]
+
+    def make_chunk(first, last):
+        return {
+            "text": " ".join(s["text"].strip() for s in segments[first:last + 1] if s["text"].strip()),
+            "start": segments[first]["start"],
+            "end": segments[last]["end"],
+            "first_segment": first,
+            "last_segment": last,
+        }
+
+    first, words = 0, 0
+    covered = -1  # last segment already in an emitted chunk
+    for i, count in enumerate(word_counts):
+        words += count
+        if words < chunk_size:
+            continue
+        yield make_chunk(first, i)
+        covered = i
+        # Step back over trailing segments for the overlap, always moving forward
+        next_first, carried = i + 1, 0
+        while next_first - 1 > first and carried < overlap:
+            next_first -= 1
+            carried += word_counts[next_first]
+        first, words = next_first, carried
+    if covered < len(segments) - 1:
+        yield make_chunk(first, len(segments) - 1)
+
+
+class TranscriptStore:
+    """
+    Persistent Whisper transcripts, one JSON file per key under
+    data/transcripts. Each record keeps the full text and the
+    segment-level timestamps: {"start", "end", "text"} in seconds.
+    """
+
+    def __init__(self, root=TRANSCRIPT_DIR):
+        self.root = root
+
+    def _path(self, key):
+        return os.path.join(self.root, f"{key}.json")
+
+    def get(self, source_id, model_name, language=None):
+        """Return the stored transcript record, or None on a miss"""
+        path = self._path(compute_transcript_key(source_id, model_name, language))
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Ignoring unreadable transcript {path}: {e}")
+            return None
+
+    def put(self, source_id, model_name, language, transcript):
+        """
+        Store a transcript dict with "text", "segments" and, optionally, the
+        detected "language". Returns the stored record.
+        """
+        record = {
+            "source_id": source_id,
+            "model": model_name,
+            "language": transcript.get("language") or language,
+            "text": transcript["text"],
+            "segments": [
+                {"start": float(s["start"]), "end": float(s["end"]), "text": s["text"]}
+                for s in transcript.get("segments", [])
+            ],
+            "created_at": datetime.datetime.now().isoformat(),
+        }
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(compute_transcript_key(source_id, model_name, language))
+        # A private temp file per writer; the last concurrent replace wins intact
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".json", dir=self.root)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(record, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return record
+
+
+# Singleton instance
+transcript_store = TranscriptStore()
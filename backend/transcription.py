@@ -0,0 +1,235 @@
+import os
+import time
+from collections import Counter, deque
+import numpy as np
+from backend.whisper_manager import whisper_manager
+
+SAMPLE_RATE = 16000  # Whisper consumes 16 kHz mono float32
+
+# Longest video we download and transcribe; splitting keeps long ones tractable
+MAX_VIDEO_SECONDS = float(os.environ.get("STUDYMATE_MAX_VIDEO_SECONDS", str(2 * 3600)))
+# Pool size for segment transcription; 0 picks one from the CPU count
+TRANSCRIBE_WORKERS = int(os.environ.get("STUDYMATE_TRANSCRIBE_WORKERS", "0"))
+# Shorter audio is transcribed in-process; loading a model per worker costs more than it saves
+PARALLEL_MIN_SECONDS = 120
+
+# Voice-activity segmentation
+FRAME_SECONDS = 0.03
+# A frame is a pause to cut at when it is within this many dB of the
+# recording's noise floor and at least this far below its loud parts
+SILENCE_MARGIN_DB = 12.0
+# Only audio below this level is dropped; relative pauses may be quiet speech
+ABSOLUTE_SILENCE_DB = -60.0
+MIN_SILENCE_SECONDS = 0.4
+# Segments are cut at the first pause after this much audio...
+TARGET_SEGMENT_SECONDS = 30.0
+# ...and unconditionally at this length when nobody pauses
+MAX_SEGMENT_SECONDS = 90.0
+# Streamed audio is segmented each time this much has been buffered
+STREAM_WINDOW_SECONDS = 2 * MAX_SEGMENT_SECONDS
+
+
+def frame_energy_db(audio, sample_rate=SAMPLE_RATE, frame_seconds=FRAME_SECONDS):
+    """RMS energy of consecutive frames, in dBFS"""
+    frame_length = max(1, int(sample_rate * frame_seconds))
+    frame_count = len(audio) // frame_length
+    if frame_count == 0:
+        return np.empty(0, dtype="float32"), frame_length
+    frames = audio[:frame_count * frame_length].reshape(frame_count, frame_length)
+    rms = np.sqrt(np.mean(np.square(frames, dtype="float64"), axis=1))
+    return (20 * np.log10(np.maximum(rms, 1e-10))).astype("float32"), frame_length
+
+
+def split_on_silence(audio, sample_rate=SAMPLE_RATE, target_seconds=TARGET_SEGMENT_SECONDS,
+                     max_seconds=MAX_SEGMENT_SECONDS, min_silence_seconds=MIN_SILENCE_SECONDS,
+                     margin_db=SILENCE_MARGIN_DB):
+    """
+    Split audio into (start, end) sample ranges at pauses in speech.
+
+    Frames within margin_db of the noise floor (5th percentile energy),
+    and margin_db below the loud frames (95th percentile), count as
+    pauses. Segments end in the middle of the first long enough pause
+    after target_seconds, or at max_seconds if there is none. Pauses only
+    choose cut points: in a recording with little true silence the floor
+    is quieter speech, so a segment is dropped only when all of it is
+    below ABSOLUTE_SILENCE_DB.
+    """
+    total = len(audio)
+    if total == 0:
+        return []
+    energy, frame_length = frame_energy_db(audio, sample_rate)
+    if len(energy) == 0:
+        return [(0, total)]
+
+    floor, loud = np.percentile(energy, [5, 95])
+    threshold = min(floor + margin_db, loud - margin_db)
+    silent = energy < ABSOLUTE_SILENCE_DB
+    pause = (energy <= threshold) | silent
+
+    # Middle of every pause long enough to cut at, in samples
+    min_frames = max(1, int(min_silence_seconds / FRAME_SECONDS))
+    cut_points = []
+    run_start = None
+    for i, is_pause in enumerate(np.append(pause, False)):
+        if is_pause and run_start is None:
+            run_start = i
+        elif not is_pause and run_start is not None:
+            if i - run_start >= min_frames:
+                cut_points.append((run_start + i) // 2 * frame_length)
+            run_start = None
+
+    target = int(target_seconds * sample_rate)
+    limit = int(max_seconds * sample_rate)
+    ranges = []
+    start = 0
+    for cut in cut_points:
+        while cut - start > limit:
+            ranges.append((start, start + limit))
+            start += limit
+        if cut - start >= target:
+            ranges.append((start, cut))
+            start = cut
+    while total - start > limit:
+        ranges.append((start, start + limit))
+        start += limit
+    if start < total:
+        ranges.append((start, total))
+
+    def has_speech(segment):
+        first, last = segment[0] // frame_length, -(-segment[1] // frame_length)
+        return not silent[first:last].all()
+
+    return [segment for segment in ranges if has_speech(segment)]
+
+
+def _shift_segments(result, offset_seconds):
+    return [
+        {"start": s["start"] + offset_seconds, "end": s["end"] + offset_seconds, "text": s["text"]}
+        for s in result.get("segments", [])
+    ]
+
+
+def _transcribe_with(model, audio, offset_seconds, language):
+    result = model.transcribe(audio, language=language)
+    return {"language": result.get("language"), "segments": _shift_segments(result, offset_seconds)}
+
+
+_worker_model = None
+
+
+def _init_transcribe_worker(model_name, threads):
+    """Each pool worker loads its own model and gets an equal share of the cores"""
+    global _worker_model
+    import torch
+    import whisper
+    torch.set_num_threads(threads)
+    _worker_model = whisper.load_model(model_name)
+
+
+def _transcribe_segment(task):
+    audio, offset_seconds, language = task
+    return _transcribe_with(_worker_model, audio, offset_seconds, language)
+
+
+def pool_size():
+    """Worker processes in a model's shared pool"""
+    return TRANSCRIBE_WORKERS or max(1, min(4, (os.cpu_count() or 1) // 2))
+
+
+def planned_workers(duration_seconds):
+    """Workers transcribe() will keep busy for audio this long, before segmenting"""
+    if duration_seconds < PARALLEL_MIN_SECONDS:
+        return 1
+    # No point keeping more workers busy than there will be segments
+    return max(1, min(pool_size(), int(duration_seconds // TARGET_SEGMENT_SECONDS)))
+
+
+def iter_speech_segments(chunks, window_seconds=STREAM_WINDOW_SECONDS):
+    """
+    Turn a stream of 16 kHz mono float32 chunks into (audio, offset_seconds)
+    speech segments as soon as they are complete. Only about one window of
+    audio is buffered: each time it fills, every segment but the last (which
+    may still be going) is emitted and the rest carried over.
+    """
+    window = int(window_seconds * SAMPLE_RATE)
+    buffer = np.empty(0, dtype="float32")
+    consumed = 0  # samples of the stream before the start of buffer
+    for chunk in chunks:
+        buffer = np.concatenate([buffer, np.asarray(chunk, dtype="float32")])
+        if len(buffer) < window:
+            continue
+        ranges = split_on_silence(buffer)
+        # A segment running to the end of the buffer may continue in the next chunk
+        if ranges and ranges[-1][1] == len(buffer):
+            keep_from = ranges.pop()[0]
+        else:
+            keep_from = len(buffer)
+        for start, end in ranges:
+            yield buffer[start:end].copy(), (consumed + start) / SAMPLE_RATE
+        buffer = buffer[keep_from:]
+        consumed += keep_from
+    for start, end in split_on_silence(buffer):
+        yield buffer[start:end], (consumed + start) / SAMPLE_RATE
+
+
+def transcribe_stream(chunks, model_name, language=None, workers=None, duration_hint=None):
+    """
+    Transcribe audio while it is still being decoded. chunks yields 16 kHz
+    mono float32 arrays (see backend/audio_stream.py); each speech segment
+    is transcribed as soon as it is complete. With more than one worker,
+    segments go to the model's shared process pool (owned by
+    whisper_manager, so workers keep their model between jobs) with a
+    bounded number in flight; a slow transcriber applies back-pressure to
+    the decoder instead of buffering the whole recording. duration_hint
+    (seconds) sets how many workers are kept busy.
+    Returns {"text", "language", "segments": [{"start", "end", "text"}]}.
+    """
+    if workers is None:
+        workers = planned_workers(duration_hint or 0)
+    segments_iter = iter_speech_segments(chunks)
+    results = []
+    if workers <= 1:
+        for audio, offset_seconds in segments_iter:
+            # Borrowed per segment so other sessions can interleave on the shared model
+            with whisper_manager.acquire(model_name) as model:
+                results.append(_transcribe_with(model, audio, offset_seconds, language))
+    else:
+        size = max(workers, pool_size())
+        threads = max(1, (os.cpu_count() or 1) // size)
+        with whisper_manager.pool(model_name, size, _init_transcribe_worker, (model_name, threads)) as executor:
+            in_flight = deque()
+            for audio, offset_seconds in segments_iter:
+                in_flight.append(executor.submit(_transcribe_segment, (audio, offset_seconds, language)))
+                if len(in_flight) > 2 * workers:
+                    results.append(in_flight.popleft().result())
+            # Collected in submission order, so segments stay in timeline order
+            results.extend(future.result() for future in in_flight)
+
+    segments = [segment for result in results for segment in result["segments"]]
+    detected = Counter(result["language"] for result in results if result["language"])
+    return {
+        "text": " ".join(s["text"].strip() for s in segments if s["text"].strip()),
+        "language": language or (detected.most_common(1)[0][0] if detected else None),
+        "segments": segments,
+    }
+
+
+def transcribe(audio, model_name, language=None, workers=None):
+    """
+    Transcribe 16 kHz mono float32 audio that is already in memory.
+
+    Segments come from split_on_silence(). With more than one worker
+    they are transcribed in the shared process pool, one model per worker, and
+    stitched back in order with timestamps relative to the whole audio.
+    The in-process path borrows the shared model from whisper_manager.
+    Returns {"text", "language", "segments": [{"start", "end", "text"}]}.
+    """
+    audio = np.ascontiguousarray(audio, dtype="float32")
+    duration = len(audio) / SAMPLE_RATE
+    if workers is None:
+        workers = planned_workers(duration)
+    started = time.perf_counter()
+    result = transcribe_stream([audio], model_name, language, workers)
+    # Compute time per audio second, comparable across pool sizes
+    whisper_manager.record_speed(model_name, duration, (time.perf_counter() - started) * workers)
+    return result
@@ -1,4 +1,4 @@
-from backend.ollama_client import ask_ollama
+from backend.ollama_client import ask_ollama, stream_ollama
 
 # Language mapping for better prompts
 LANGUAGE_NAMES = {
@@ -14,14 +14,10 @@ LANGUAGE_NAMES = {
     "ar": "Arabic"
 }
 
-def translate_text(text, target_language):
-    """
-    Uses Ollama to translate text between languages
-    """
-    try:
-        target_name = LANGUAGE_NAMES.get(target_language, target_language)
-        
-        prompt = f"""
+def build_translation_prompt(text, target_language):
+    target_name = LANGUAGE_NAMES.get(target_language, target_language)
+    
+    return f"""
         You are a professional translator. Translate the following English text to {target_name}.
         Provide only the translation, no additional text or explanations.
         
@@ -29,23 +25,37 @@ def translate_text(text, target_language):
         
         Translation:
         """
-        
-        translation = ask_ollama(prompt)
-        
-        # Clean up the response (remove any extra text Ollama might add)
-        translation = translation.strip()
-        
-        # Remove any prefix like "Translation:" or similar
-        if ':' in translation:
-            parts = translation.split(':', 1)
-            if len(parts) > 1:
-                translation = parts[1].strip()
-        
-        return translation
+
+def clean_translation(translation):
+    """Clean up the response (remove any extra text Ollama might add)"""
+    translation = translation.strip()
+    
+    # Remove any prefix like "Translation:" or similar
+    if ':' in translation:
+        parts = translation.split(':', 1)
+        if len(parts) > 1:
+            translation = parts[1].strip()
+    
+    return translation
+
+def translate_text(text, target_language):
+    """
+    Uses Ollama to translate text between languages
+    """
+    try:
+        translation = ask_ollama(build_translation_prompt(text, target_language))
+        return clean_translation(translation)
         
     except Exception as e:
         return f"Translation failed: {str(e)}"
 
+def stream_translation(text, target_language, stats=None):
+    """
+    Yields the raw translation token by token; pass the joined result
+    through clean_translation() once streaming has finished
+    """
+    return stream_ollama(build_translation_prompt(text, target_language), stats)
+
 # Language options with codes and flags
 LANGUAGE_OPTIONS = {
     "es": {"name": "Spanish", "flag": "🇪🇸"},
@@ -0,0 +1,88 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from backend.db import Database, DB_PATH
+
+# Titles, durations and thumbnails rarely change; refetch them after this long
+VIDEO_INFO_TTL_SECONDS = float(os.environ.get("STUDYMATE_VIDEO_INFO_TTL", str(24 * 3600)))
+# The full extractor result holds signed stream URLs that expire after a few
+# hours, so it is only kept in memory and only long enough to start a download
+RAW_INFO_TTL_SECONDS = 1800
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS video_info (
+    video_id TEXT PRIMARY KEY,
+    info TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+"""
+
+
+class VideoInfoCache:
+    """
+    Video metadata keyed by canonical YouTube video id. The summary dict
+    returned by get_video_info() is persisted in SQLite with a TTL; the raw
+    extractor result is kept in memory so a download can reuse it instead
+    of extracting the same video again.
+    """
+
+    def __init__(self, path=DB_PATH, ttl_seconds=VIDEO_INFO_TTL_SECONDS,
+                 raw_ttl_seconds=RAW_INFO_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.raw_ttl_seconds = raw_ttl_seconds
+        self._db = Database(path, SCHEMA)
+        self._raw = {}  # video_id -> (fetched_at, raw info)
+        self._lock = threading.Lock()
+
+    def get(self, video_id):
+        """Return the cached summary, or None when missing or expired"""
+        try:
+            row = self._db.connection().execute(
+                "SELECT info, fetched_at FROM video_info WHERE video_id = ?", (video_id,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Video info cache read failed: {e}")
+            return None
+        if row is None or time.time() - row["fetched_at"] > self.ttl_seconds:
+            return None
+        return json.loads(row["info"])
+
+    def get_raw(self, video_id):
+        with self._lock:
+            cached = self._raw.get(video_id)
+            if cached is None:
+                return None
+            if time.time() - cached[0] > self.raw_ttl_seconds:
+                del self._raw[video_id]
+                return None
+            return cached[1]
+
+    def put(self, video_id, info, raw=None):
+        now = time.time()
+        if raw is not None:
+            with self._lock:
+                self._raw[video_id] = (now, raw)
+                # Drop expired raw results so memory stays bounded by recent lookups
+                for key in [k for k, (t, _) in self._raw.items() if now - t > self.raw_ttl_seconds]:
+                    del self._raw[key]
+        try:
+            conn = self._db.connection()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO video_info (video_id, info, fetched_at) VALUES (?, ?, ?)",
+                    (video_id, json.dumps(info), now),
+                )
+        except sqlite3.Error as e:
+            print(f"Video info cache write failed: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._raw.clear()
+        with self._db.connection() as conn:
+            conn.execute("DELETE FROM video_info")
+
+
+# Singleton instance
+video_info_cache = VideoInfoCache()
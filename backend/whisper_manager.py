@@ -0,0 +1,273 @@
+import os
+import time
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+DEFAULT_MODEL = os.environ.get("STUDYMATE_WHISPER_MODEL", "base")
+# Model loaded in the background at startup ("" disables preloading)
+PRELOAD_MODEL = os.environ.get("STUDYMATE_WHISPER_PRELOAD", "")
+# Loaded models are freed after this long without use; 0 keeps them forever
+IDLE_EVICT_SECONDS = float(os.environ.get("STUDYMATE_WHISPER_IDLE_SECONDS", "600"))
+# Target wall time for one transcription; 0 always uses DEFAULT_MODEL
+LATENCY_BUDGET_SECONDS = float(os.environ.get("STUDYMATE_WHISPER_LATENCY_BUDGET", "0"))
+
+# Smallest to largest, with rough CPU seconds of compute per second of audio.
+# Measured speeds replace these estimates once a model has been used.
+MODEL_SIZES = ("tiny", "base", "small", "medium")
+ESTIMATED_SECONDS_PER_AUDIO_SECOND = {"tiny": 0.03, "base": 0.06, "small": 0.2, "medium": 0.6}
+# Weight of the newest measurement in the running speed average
+SPEED_SMOOTHING = 0.3
+
+
+def models_at_least(model_name):
+    """model_name followed by every larger known model, best match first"""
+    if model_name not in MODEL_SIZES:
+        return [model_name]
+    return list(MODEL_SIZES[MODEL_SIZES.index(model_name):])
+
+
+class WhisperManager:
+    """
+    Owns the Whisper models. One in-process instance of each model is
+    shared by every session; a per-model lock serialises transcriptions on
+    it. Long audio goes to a persistent process pool per model whose
+    workers load the model once and keep it across jobs. Models and pools
+    can be preloaded at startup, are evicted after an idle timeout, and
+    their load time and memory footprint are reported by stats().
+    """
+
+    def __init__(self, default_model=DEFAULT_MODEL, idle_seconds=IDLE_EVICT_SECONDS,
+                 latency_budget=LATENCY_BUDGET_SECONDS, preload=PRELOAD_MODEL):
+        self.default_model = default_model
+        self.idle_seconds = idle_seconds
+        self.latency_budget = latency_budget
+        self._models = {}  # name -> {"model", "lock", "load_seconds", "memory_bytes", "uses", "last_used", "timer"}
+        self._pools = {}  # name -> {"executor", "workers", "in_use", "uses", "last_used", "timer"}
+        self._speeds = dict(ESTIMATED_SECONDS_PER_AUDIO_SECOND)
+        self._lock = threading.Lock()
+        if preload:
+            self.preload(preload)
+
+    def preload(self, model_name=None):
+        """Load a model on a background thread so the first request does not wait for it"""
+        thread = threading.Thread(
+            target=self._load, args=(model_name or self.default_model,),
+            name="studymate-whisper-preload", daemon=True,
+        )
+        thread.start()
+        return thread
+
+    def _entry(self, model_name):
+        with self._lock:
+            entry = self._models.get(model_name)
+            if entry is None:
+                entry = {"model": None, "lock": threading.Lock(), "load_seconds": None,
+                         "memory_bytes": None, "uses": 0, "last_used": None, "timer": None}
+                self._models[model_name] = entry
+            return entry
+
+    def _ensure_loaded(self, model_name, entry):
+        """Load the model into its entry; the caller holds the entry lock"""
+        if entry["model"] is not None:
+            return
+        import whisper
+        started = time.perf_counter()
+        model = whisper.load_model(model_name)
+        entry["load_seconds"] = time.perf_counter() - started
+        entry["memory_bytes"] = sum(
+            t.numel() * t.element_size() for t in list(model.parameters()) + list(model.buffers())
+        )
+        entry["model"] = model
+        print(f"Loaded Whisper '{model_name}' in {entry['load_seconds']:.1f}s "
+              f"({entry['memory_bytes'] / 2**20:.0f} MiB)")
+
+    def _load(self, model_name):
+        entry = self._entry(model_name)
+        # Concurrent first requests wait on the entry lock instead of loading twice
+        with entry["lock"]:
+            try:
+                self._ensure_loaded(model_name, entry)
+            except Exception as e:
+                print(f"Error loading Whisper model: {e}")
+            else:
+                entry["last_used"] = time.time()
+                self._schedule_eviction(model_name, entry)
+
+    @contextmanager
+    def acquire(self, model_name=None):
+        """Use a shared model exclusively for the duration of the block"""
+        model_name = model_name or self.default_model
+        entry = self._entry(model_name)
+        with entry["lock"]:
+            self._ensure_loaded(model_name, entry)
+            self._cancel_eviction(entry)
+            try:
+                yield entry["model"]
+            finally:
+                entry["uses"] += 1
+                entry["last_used"] = time.time()
+                self._schedule_eviction(model_name, entry)
+
+    @contextmanager
+    def pool(self, model_name, max_workers, initializer, initargs=()):
+        """
+        Use the model's shared process pool for the duration of the block,
+        starting it on first use. Workers are spawned on demand up to
+        max_workers and run initializer(*initargs) once, so the model is
+        loaded per worker rather than per job. A pool that broke (a worker
+        died) is discarded and restarted on next use.
+        """
+        with self._lock:
+            pool = self._pools.get(model_name)
+            if pool is None:
+                # Spawned, not forked: forking the multithreaded server after torch/OpenMP
+                # have started their threads can deadlock the workers
+                executor = ProcessPoolExecutor(max_workers=max_workers, initializer=initializer, initargs=initargs,
+                                               mp_context=multiprocessing.get_context("spawn"))
+                pool = {"executor": executor,
+                        "workers": max_workers, "in_use": 0, "uses": 0, "last_used": None, "timer": None}
+                self._pools[model_name] = pool
+            self._cancel_eviction(pool)
+            pool["in_use"] += 1
+        try:
+            yield pool["executor"]
+        except BrokenProcessPool:
+            with self._lock:
+                if self._pools.get(model_name) is pool:
+                    del self._pools[model_name]
+            pool["executor"].shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            with self._lock:
+                pool["in_use"] -= 1
+                pool["uses"] += 1
+                pool["last_used"] = time.time()
+                if self._pools.get(model_name) is pool:
+                    self._schedule_pool_eviction(model_name, pool)
+
+    def _schedule_pool_eviction(self, model_name, pool):
+        """The caller holds self._lock"""
+        self._cancel_eviction(pool)
+        if self.idle_seconds <= 0 or pool["in_use"]:
+            return
+        timer = threading.Timer(self.idle_seconds, self._evict_pool_if_idle, args=(model_name,))
+        timer.daemon = True
+        pool["timer"] = timer
+        timer.start()
+
+    def _evict_pool_if_idle(self, model_name):
+        with self._lock:
+            pool = self._pools.get(model_name)
+            if pool is None or pool["in_use"] or time.time() - pool["last_used"] < self.idle_seconds:
+                return
+            del self._pools[model_name]
+        pool["executor"].shutdown(wait=False)
+        print(f"Stopped idle Whisper '{model_name}' worker pool")
+
+    def _cancel_eviction(self, entry):
+        if entry["timer"] is not None:
+            entry["timer"].cancel()
+            entry["timer"] = None
+
+    def _schedule_eviction(self, model_name, entry):
+        self._cancel_eviction(entry)
+        if self.idle_seconds <= 0:
+            return
+        timer = threading.Timer(self.idle_seconds, self._evict_if_idle, args=(model_name,))
+        timer.daemon = True
+        entry["timer"] = timer
+        timer.start()
+
+    def _evict_if_idle(self, model_name):
+        with self._lock:
+            entry = self._models.get(model_name)
+        # A model in use holds its lock; it gets a fresh timer when released
+        if entry is None or not entry["lock"].acquire(blocking=False):
+            return
+        try:
+            if entry["last_used"] and time.time() - entry["last_used"] >= self.idle_seconds:
+                entry["model"] = None
+                entry["timer"] = None
+                print(f"Evicted idle Whisper '{model_name}'")
+        finally:
+            entry["lock"].release()
+
+    def evict(self, model_name=None):
+        """Free a model and its idle worker pool now (or every model); they are reloaded on next use"""
+        with self._lock:
+            names = [model_name] if model_name else list(self._models) + list(self._pools)
+            entries = [self._models[name] for name in names if name in self._models]
+            pools = []
+            for name in set(names):
+                pool = self._pools.get(name)
+                if pool is not None and not pool["in_use"]:
+                    self._cancel_eviction(pool)
+                    pools.append(self._pools.pop(name))
+        for pool in pools:
+            pool["executor"].shutdown(wait=False)
+        for entry in entries:
+            with entry["lock"]:
+                self._cancel_eviction(entry)
+                entry["model"] = None
+
+    def record_speed(self, model_name, audio_seconds, elapsed_seconds):
+        """Feed an observed transcription time back into model selection"""
+        if audio_seconds <= 0:
+            return
+        speed = elapsed_seconds / audio_seconds
+        with self._lock:
+            previous = self._speeds.get(model_name)
+            self._speeds[model_name] = speed if previous is None else (
+                SPEED_SMOOTHING * speed + (1 - SPEED_SMOOTHING) * previous
+            )
+
+    def choose_model(self, audio_seconds, latency_budget=None, parallelism=1):
+        """
+        Largest model, up to the default one, expected to transcribe
+        audio_seconds of audio within the latency budget. Without a budget
+        the default model is used; when nothing fits the smallest one is.
+        """
+        budget = self.latency_budget if latency_budget is None else latency_budget
+        if budget <= 0 or not audio_seconds or self.default_model not in MODEL_SIZES:
+            return self.default_model
+        candidates = MODEL_SIZES[:MODEL_SIZES.index(self.default_model) + 1]
+        with self._lock:
+            speeds = dict(self._speeds)
+        for model_name in reversed(candidates):
+            if audio_seconds * speeds[model_name] / max(1, parallelism) <= budget:
+                return model_name
+        return candidates[0]
+
+    def stats(self):
+        """
+        Load time, memory footprint and use count of every model seen so
+        far. pool_workers is the size of the model's live worker pool (0
+        when none); each worker holds its own copy of the model.
+        """
+        with self._lock:
+            entries = dict(self._models)
+            pools = dict(self._pools)
+            speeds = dict(self._speeds)
+        stats = {}
+        for name in list(entries) + [name for name in pools if name not in entries]:
+            entry = entries.get(name)
+            pool = pools.get(name)
+            loaded = entry is not None and entry["model"] is not None
+            stats[name] = {
+                "loaded": loaded,
+                "load_seconds": entry["load_seconds"] if entry else None,
+                "memory_bytes": entry["memory_bytes"] if loaded else 0,
+                "uses": (entry["uses"] if entry else 0) + (pool["uses"] if pool else 0),
+                "last_used": max(filter(None, [entry and entry["last_used"], pool and pool["last_used"]]),
+                                 default=None),
+                "pool_workers": pool["workers"] if pool else 0,
+                "seconds_per_audio_second": speeds.get(name),
+            }
+        return stats
+
+
+# Singleton instance
+whisper_manager = WhisperManager()
@@ -3,125 +3,265 @@ import whisper
 import tempfile
 import os
 import re
-import json
+import copy
+import urllib.parse
 import time
+import threading
+from contextlib import contextmanager
 from backend.ollama_client import ask_ollama
+from backend.llm_json import parse_quiz_response
+from backend.video_info_cache import video_info_cache
+from backend.transcript_store import transcript_store, compute_file_source_id
+from backend.transcription import transcribe, transcribe_stream, planned_workers, MAX_VIDEO_SECONDS, SAMPLE_RATE
+from backend.audio_stream import ffmpeg_available, select_audio_url, iter_pcm_chunks
+from backend.whisper_manager import whisper_manager, models_at_least
+
+YOUTUBE_URL_PATTERN = re.compile(
+    r'(https?://)?(www\.)?'
+    r'(youtube|youtu|youtube-nocookie)\.(com|be)/'
+    r'(watch\?v=|embed/|v/|.+\?v=)?([^&=%\?]{11})'
+)
+VIDEO_ID_PATTERN = re.compile(r'[A-Za-z0-9_-]{11}')
+
+
+def extract_video_id(url):
+    """Return the 11-character video id of a YouTube URL, or None"""
+    url = url.strip()
+    match = YOUTUBE_URL_PATTERN.match(url)
+    if not match:
+        return None
+    if VIDEO_ID_PATTERN.fullmatch(match.group(6)):
+        return match.group(6)
+    # watch URLs where v= is not the first query parameter
+    query = urllib.parse.urlparse(url if "://" in url else f"https://{url}").query
+    video_id = urllib.parse.parse_qs(query).get("v", [""])[0]
+    return video_id if VIDEO_ID_PATTERN.fullmatch(video_id) else None
+
+
+def canonical_video_url(video_id):
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+def extract_with_ytdlp(url):
+    """Default metadata extractor: a single yt-dlp lookup without downloading"""
+    with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True}) as ydl:
+        return ydl.extract_info(url, download=False)
+
+
+def summarize_video_info(info):
+    """The subset of an extractor result the app shows and stores with quizzes"""
+    return {
+        'title': info.get('title', 'Unknown Title'),
+        'duration': info.get('duration', 0),
+        'upload_date': info.get('upload_date', ''),
+        'view_count': info.get('view_count', 0),
+        'thumbnail': info.get('thumbnail', ''),
+        'description': info.get('description', '')[:200] + '...' if info.get('description') else 'No description'
+    }
+
+
+# One lock per video id, so concurrent jobs never download and transcribe the same video twice
+_transcript_locks = {}
+_transcript_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _transcript_lock(video_id):
+    with _transcript_locks_guard:
+        lock = _transcript_locks.setdefault(video_id, threading.Lock())
+    with lock:
+        yield
+
 
 class YouTubeProcessor:
-    def __init__(self):
-        self.model = None
-    
-    def load_whisper_model(self):
-        """Load the Whisper model for speech recognition"""
-        try:
-            self.model = whisper.load_model("base")
-            return True
-        except Exception as e:
-            print(f"Error loading Whisper model: {e}")
-            return False
+    def __init__(self, extractor=None, info_cache=None, transcripts=None):
+        # extractor(url) -> raw info dict; swapped for a fake in offline checks
+        self.extractor = extractor or extract_with_ytdlp
+        self.info_cache = info_cache or video_info_cache
+        self.transcripts = transcripts or transcript_store
     
     def is_valid_youtube_url(self, url):
         """Check if the URL is a valid YouTube URL"""
-        youtube_regex = (
-            r'(https?://)?(www\.)?'
-            r'(youtube|youtu|youtube-nocookie)\.(com|be)/'
-            r'(watch\?v=|embed/|v/|.+\?v=)?([^&=%\?]{11})'
-        )
-        return re.match(youtube_regex, url) is not None
+        return YOUTUBE_URL_PATTERN.match(url) is not None
     
-    def download_audio(self, youtube_url):
-        """Download audio from YouTube video with better error handling"""
+    def _get_raw_info(self, youtube_url):
+        """Full extractor result, reused from get_video_info while its stream URLs are fresh"""
+        video_id = extract_video_id(youtube_url)
+        info = self.info_cache.get_raw(video_id) if video_id else None
+        if info is None:
+            info = self.extractor(canonical_video_url(video_id) if video_id else youtube_url)
+            if info and video_id:
+                self.info_cache.put(video_id, summarize_video_info(info), raw=info)
+        
+        # Check if video is available
+        if not info:
+            raise Exception("Video not available")
+        
+        # Check duration limit
+        if (info.get('duration') or 0) > MAX_VIDEO_SECONDS:
+            raise Exception(f"Video too long (max {MAX_VIDEO_SECONDS / 60:.0f} minutes)")
+        
+        return info
+    
+    def download_audio(self, youtube_url, target_dir):
+        """
+        Download the best audio stream into target_dir as-is; Whisper decodes
+        any container, so there is no MP3 re-encode. The caller owns target_dir.
+        """
         try:
-            # Create temporary directory for audio
-            temp_dir = tempfile.mkdtemp()
-            temp_audio_path = os.path.join(temp_dir, 'audio.mp3')
-            
+            info = self._get_raw_info(youtube_url)
             ydl_opts = {
                 'format': 'bestaudio/best',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
-                'outtmpl': temp_audio_path.replace('.mp3', ''),
+                'outtmpl': os.path.join(target_dir, 'audio.%(ext)s'),
                 'quiet': True,
                 'no_warnings': True,
             }
             
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                # Try to get info first to validate URL
-                info = ydl.extract_info(youtube_url, download=False)
-                
-                # Check if video is available
-                if not info:
-                    raise Exception("Video not available")
-                
-                # Check duration limit (15 minutes)
-                if info.get('duration', 0) > 900:
-                    raise Exception("Video too long (max 15 minutes)")
-                
-                # Download the audio
-                ydl.download([youtube_url])
-                
-                # Check if file was created
-                if not os.path.exists(temp_audio_path):
-                    # Try to find the actual file name
-                    for file in os.listdir(temp_dir):
-                        if file.endswith('.mp3'):
-                            temp_audio_path = os.path.join(temp_dir, file)
-                            break
-                
-                if os.path.exists(temp_audio_path):
-                    return temp_audio_path
-                else:
-                    raise Exception("Audio file not created")
+                # Download from the already extracted info (no second lookup)
+                ydl.process_ie_result(copy.deepcopy(info), download=True)
+            
+            for name in os.listdir(target_dir):
+                if name.startswith('audio.') and not name.endswith('.part'):
+                    return os.path.join(target_dir, name)
+            raise Exception("Audio file not created")
                 
         except Exception as e:
             print(f"Error downloading audio: {e}")
-            # Clean up temporary directory
-            try:
-                import shutil
-                shutil.rmtree(temp_dir, ignore_errors=True)
-            except:
-                pass
             return None
     
-    def transcribe_audio(self, audio_path):
-        """Transcribe audio to text using Whisper"""
+    def stream_transcript(self, youtube_url, language=None, model_name=None):
+        """
+        Decode the video's audio stream once, straight to 16 kHz mono PCM,
+        and transcribe it segment by segment while it is still arriving.
+        Raises when the stream cannot be read.
+        """
+        info = self._get_raw_info(youtube_url)
+        audio_url, headers = select_audio_url(info)
+        if not audio_url:
+            raise Exception("No direct audio stream")
+        duration = info.get('duration') or 0
+        model_name = model_name or self.choose_whisper_model(duration)
+        return transcribe_stream(iter_pcm_chunks(audio_url, headers), model_name,
+                                 language=language, duration_hint=duration)
+    
+    def choose_whisper_model(self, duration_seconds):
+        """Model size for audio this long, within the configured latency budget"""
+        return whisper_manager.choose_model(duration_seconds, parallelism=planned_workers(duration_seconds))
+    
+    def transcribe_audio_segments(self, audio_path, language=None, model_name=None):
+        """
+        Transcribe audio with Whisper, keeping the segment timestamps.
+        The audio is split on silence and long recordings are transcribed
+        in parallel (see backend/transcription.py).
+        Returns {"text", "language", "segments": [{"start", "end", "text"}]}.
+        """
         try:
-            if not self.model:
-                if not self.load_whisper_model():
-                    return None
-            
-            result = self.model.transcribe(audio_path)
-            return result['text']
+            audio = whisper.load_audio(audio_path)
+            model_name = model_name or self.choose_whisper_model(len(audio) / SAMPLE_RATE)
+            return transcribe(audio, model_name, language=language)
             
         except Exception as e:
             print(f"Error transcribing audio: {e}")
             return None
     
+    def transcribe_audio(self, audio_path):
+        """Transcribe audio to text using Whisper"""
+        transcript = self.transcribe_audio_segments(audio_path)
+        return transcript["text"] if transcript else None
+    
+    def transcribe_file(self, audio_path, language=None, model_name=None):
+        """Transcribe a local audio file, reusing the stored transcript of identical content"""
+        model_name = model_name or whisper_manager.default_model
+        source_id = compute_file_source_id(audio_path)
+        record = self.transcripts.get(source_id, model_name, language)
+        if record:
+            return record
+        transcript = self.transcribe_audio_segments(audio_path, language, model_name)
+        if not transcript:
+            return None
+        return self.transcripts.put(source_id, model_name, language, transcript)
+    
+    def _stored_transcript(self, video_id, model_name, language):
+        for stored_model in models_at_least(model_name):
+            record = self.transcripts.get(video_id, stored_model, language)
+            if record:
+                return record
+        return None
+    
+    def get_transcript(self, youtube_url, language=None):
+        """
+        Transcript record of a video. A video already transcribed in the
+        same language, with the chosen Whisper model or a larger one, skips
+        download and transcription; the chosen model can change as measured
+        speeds update, so a stored transcript is not tied to it. Concurrent
+        jobs for one video wait for each other instead of transcribing twice.
+        """
+        video_info = self.get_video_info(youtube_url) or {}
+        model_name = self.choose_whisper_model(video_info.get('duration') or 0)
+        video_id = extract_video_id(youtube_url)
+        if not video_id:
+            return self._transcribe_video(youtube_url, language, model_name)
+        
+        record = self._stored_transcript(video_id, model_name, language)
+        if record:
+            return record
+        with _transcript_lock(video_id):
+            # Another job may have stored it while we waited
+            record = self._stored_transcript(video_id, model_name, language)
+            if record:
+                return record
+            transcript = self._transcribe_video(youtube_url, language, model_name)
+            if not transcript:
+                return None
+            try:
+                return self.transcripts.put(video_id, model_name, language, transcript)
+            except OSError as e:
+                # The transcript is still usable; it just is not reused next time
+                print(f"Could not store transcript: {e}")
+                return transcript
+    
+    def _transcribe_video(self, youtube_url, language, model_name):
+        """Stream or download the audio and transcribe it; None on failure"""
+        transcript = None
+        if ffmpeg_available():
+            try:
+                transcript = self.stream_transcript(youtube_url, language, model_name)
+            except Exception as e:
+                print(f"Streaming transcription failed, downloading instead: {e}")
+        
+        if not transcript or not transcript["text"].strip():
+            # Removed on exit even when the download or transcription raises
+            with tempfile.TemporaryDirectory(prefix="studymate-audio-") as temp_dir:
+                audio_path = self.download_audio(youtube_url, temp_dir)
+                if not audio_path:
+                    print("Audio download failed")
+                    return None
+                transcript = self.transcribe_audio_segments(audio_path, language, model_name)
+        
+        if not transcript or not transcript["text"].strip():
+            print("Transcription failed")
+            return None
+        return transcript
+    
     def get_video_info(self, youtube_url):
-        """Get video information with better error handling"""
+        """Get video information, from the metadata cache when possible"""
         try:
-            ydl_opts = {
-                'quiet': True,
-                'no_warnings': True,
-            }
+            video_id = extract_video_id(youtube_url)
+            if video_id:
+                cached = self.info_cache.get(video_id)
+                if cached:
+                    return cached
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(youtube_url, download=False)
-                
-                if not info:
-                    return None
-                
-                return {
-                    'title': info.get('title', 'Unknown Title'),
-                    'duration': info.get('duration', 0),
-                    'upload_date': info.get('upload_date', ''),
-                    'view_count': info.get('view_count', 0),
-                    'thumbnail': info.get('thumbnail', ''),
-                    'description': info.get('description', '')[:200] + '...' if info.get('description') else 'No description'
-                }
+            # Extract the canonical URL so playlist or timestamp parameters are ignored
+            info = self.extractor(canonical_video_url(video_id) if video_id else youtube_url)
+            if not info:
+                return None
+            
+            video_info = summarize_video_info(info)
+            if video_id:
+                self.info_cache.put(video_id, video_info, raw=info)
+            return video_info
                 
         except Exception as e:
             print(f"Error getting video info: {e}")
@@ -147,9 +287,11 @@ class YouTubeProcessor:
         except Exception as e:
             return None, f"Alternative method failed: {str(e)}"
     
-    def process_youtube_video(self, youtube_url):
+    def process_youtube_transcript(self, youtube_url):
         """
-        Process YouTube video and return transcript with multiple fallbacks
+        Process YouTube video and return its transcript record with multiple
+        fallbacks. When no transcript can be made, the record holds the video
+        metadata as text and has no timed segments.
         """
         try:
             # Validate YouTube URL
@@ -161,58 +303,134 @@ class YouTubeProcessor:
             if not video_info:
                 return None, "Could not get video information"
             
-            # Check if video is too long (more than 15 minutes)
-            if video_info['duration'] > 900:  # 15 minutes in seconds
-                return None, "Video too long. Please use videos under 15 minutes."
+            # Check if video is too long to transcribe
+            if (video_info['duration'] or 0) > MAX_VIDEO_SECONDS:
+                return None, f"Video too long. Please use videos under {MAX_VIDEO_SECONDS / 60:.0f} minutes."
             
-            # Try to download and transcribe audio
-            audio_path = self.download_audio(youtube_url)
-            if not audio_path:
-                # If audio download fails, try alternative method
-                print("Audio download failed. Using video metadata as fallback...")
+            # Stored transcript, or download and transcribe the audio once
+            record = self.get_transcript(youtube_url)
+            if not record:
+                # If download or transcription fails, try alternative method
+                print("Using video metadata as fallback...")
                 transcript, error = self.get_video_transcript_alternative(youtube_url)
                 if error:
                     return None, error
-                return transcript, video_info
-            
-            # Transcribe audio
-            transcript = self.transcribe_audio(audio_path)
+                return {"text": transcript, "segments": []}, video_info
             
-            # Clean up temporary files
-            try:
-                import shutil
-                shutil.rmtree(os.path.dirname(audio_path), ignore_errors=True)
-            except:
-                pass
-            
-            if not transcript:
-                # If transcription fails, try alternative method
-                print("Transcription failed. Using video metadata as fallback...")
-                transcript, error = self.get_video_transcript_alternative(youtube_url)
-                if error:
-                    return None, error
-                return transcript, video_info
-            
-            return transcript, video_info
+            return record, video_info
             
         except Exception as e:
             print(f"Error processing YouTube video: {e}")
             return None, f"Processing error: {str(e)}"
+    
+    def process_youtube_video(self, youtube_url):
+        """
+        Process YouTube video and return transcript with multiple fallbacks
+        """
+        record, video_info = self.process_youtube_transcript(youtube_url)
+        if not record:
+            return None, video_info  # video_info contains error message
+        return record["text"], video_info
 
 # Singleton instance
 youtube_processor = YouTubeProcessor()
 
+def format_timestamp(seconds):
+    """Seconds as m:ss, or h:mm:ss for long videos"""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+def timestamp_url(youtube_url, seconds):
+    """Link that starts the video at the given second"""
+    video_id = extract_video_id(youtube_url)
+    base = canonical_video_url(video_id) if video_id else youtube_url
+    separator = "&" if "?" in base else "?"
+    return f"{base}{separator}t={int(seconds)}s"
+
+def quiz_video_info(video_info, youtube_url):
+    """Video details stored with a quiz"""
+    return {
+        "title": video_info['title'],
+        "duration": video_info['duration'],
+        "url": youtube_url,
+        "thumbnail": video_info.get('thumbnail', '')
+    }
+
+def _locate_question(question, segments, first, last):
+    """
+    Start time of the segment within segments[first:last + 1] sharing the
+    most words with the question and its correct answer; the chunk start
+    when nothing matches.
+    """
+    correct = question.get("options", {}).get(str(question.get("correct_answer", "")).lower(), "")
+    words = {w for w in re.findall(r"\w+", f"{question['question']} {correct}".lower()) if len(w) > 3}
+    best, best_score = segments[first]["start"], 0
+    for segment in segments[first:last + 1]:
+        score = len(words & set(re.findall(r"\w+", segment["text"].lower())))
+        if score > best_score:
+            best, best_score = segment["start"], score
+    return best
+
 def generate_quiz_from_youtube(youtube_url, difficulty="medium", num_questions=5):
     """
-    Generate quiz from YouTube video content with multiple fallbacks
+    Generate quiz from YouTube video content with multiple fallbacks.
+    
+    The whole transcript is used: it is chunked along Whisper segments and
+    indexed like a PDF, representative chunks are sampled across the
+    timeline and questions are generated per chunk, so each prompt stays
+    small. Every question records the timestamp it was drawn from.
     """
+    # quiz_generator imports this module, so its helpers are imported here
+    from backend.quiz_generator import generate_question_groups, merge_questions
+    from backend.index_store import get_or_build_transcript_index
+    from backend.index_factory import get_index_vectors
+    
     try:
         # Process YouTube video
-        transcript, video_info = youtube_processor.process_youtube_video(youtube_url)
+        record, video_info = youtube_processor.process_youtube_transcript(youtube_url)
         
-        if not transcript:
+        if not record:
             return None, video_info  # video_info contains error message
         
+        num_questions = min(num_questions, 20)
+        questions = []
+        if record["segments"]:
+            try:
+                entry = get_or_build_transcript_index(record)
+                positions, question_groups = generate_question_groups(
+                    entry["chunks"], difficulty, num_questions, get_index_vectors(entry["index"])
+                )
+                for position, group in zip(positions, question_groups):
+                    meta = entry["chunk_meta"][position]
+                    for question in group:
+                        if not isinstance(question, dict) or "question" not in question:
+                            continue
+                        seconds = _locate_question(question, record["segments"],
+                                                   meta["first_segment"], meta["last_segment"])
+                        question["timestamp"] = int(seconds)
+                        question["timestamp_url"] = timestamp_url(youtube_url, seconds)
+                questions = merge_questions(question_groups, num_questions)
+            except Exception as e:
+                print(f"Transcript quiz generation failed: {e}")
+        
+        if not questions:
+            return _generate_quiz_single_prompt(record["text"], video_info, youtube_url,
+                                                difficulty, num_questions)
+        
+        return {
+            "quiz_title": f"Quiz based on: {video_info['title'][:50]}",
+            "video_info": quiz_video_info(video_info, youtube_url),
+            "questions": questions
+        }, None
+        
+    except Exception as e:
+        print(f"Error generating quiz from YouTube: {e}")
+        return None, f"Error: {str(e)}"
+
+def _generate_quiz_single_prompt(transcript, video_info, youtube_url, difficulty, num_questions):
+    """Ask for the whole quiz in one prompt; used for metadata-only content or when per-chunk generation fails"""
+    try:
         # Generate quiz using Ollama
         prompt = f"""
         Based on the following YouTube video content, generate {num_questions} {difficulty}-level multiple choice questions.
@@ -252,27 +470,15 @@ def generate_quiz_from_youtube(youtube_url, difficulty="medium", num_questions=5
         }}
         """
         
-        response = ask_ollama(prompt)
+        response = ask_ollama(prompt, format="json")
         
-        # Try to extract JSON from the response
         try:
-            if '```json' in response:
-                json_str = response.split('```json')[1].split('```')[0].strip()
-            elif '```' in response:
-                json_str = response.split('```')[1].split('```')[0].strip()
-            else:
-                json_str = response.strip()
-                json_start = json_str.find('{')
-                if json_start != -1:
-                    json_str = json_str[json_start:]
-                json_end = json_str.rfind('}')
-                if json_end != -1:
-                    json_str = json_str[:json_end+1]
-            
-            quiz_data = json.loads(json_str)
+            quiz_data = parse_quiz_response(response)
+            quiz_data.setdefault("quiz_title", f"Quiz based on: {video_info['title'][:50]}")
+            quiz_data.setdefault("video_info", quiz_video_info(video_info, youtube_url))
             return quiz_data, None
             
-        except (json.JSONDecodeError, ValueError) as e:
+        except ValueError as e:
             print(f"JSON parsing failed: {e}")
             print(f"Raw response: {response}")
             return None, "Failed to generate quiz from video content"
@@ -0,0 +1,67 @@
+import json
+import pytest
+from backend.llm_json import (
+    extract_json_object, salvage_questions, parse_quiz_response, is_valid_question,
+)
+
+
+def _question(text, correct="a", **options):
+    return {
+        "question": text,
+        "options": options or {"a": "First", "b": "Second"},
+        "correct_answer": correct,
+        "explanation": "Because.",
+    }
+
+
+def test_parses_fenced_quiz():
+    quiz = {"quiz_title": "T", "questions": [_question("Q1?")]}
+    response = f"Here you go:\n```json\n{json.dumps(quiz)}\n```"
+    assert parse_quiz_response(response) == quiz
+
+
+def test_extract_repairs_trailing_commas():
+    assert extract_json_object('{"a": [1, 2,], "b": "x",}') == {"a": [1, 2], "b": "x"}
+
+
+def test_salvage_keeps_complete_questions_of_truncated_output():
+    complete = json.dumps(_question("Q1?"))
+    response = f'{{"quiz_title": "T", "questions": [{complete}, {{"question": "Q2?", "opti'
+    quiz = parse_quiz_response(response)
+    assert quiz["quiz_title"] == "T"
+    assert [q["question"] for q in quiz["questions"]] == ["Q1?"]
+
+
+def test_salvage_keeps_curly_quotes_inside_valid_strings():
+    complete = json.dumps(_question("What does “X” mean?"), ensure_ascii=False)
+    response = f'{{"questions": [{complete}, {{"question": "cut off'
+    assert [q["question"] for q in salvage_questions(response)] == ["What does “X” mean?"]
+
+
+def test_salvage_repairs_only_the_failing_object():
+    response = (
+        '{"questions": ['
+        '{"question": "Keep “this”", "options": {"a": "x, ]", "b": "y"}, "correct_answer": "a"}, '
+        '{“question”: “Second”, "options": {"a": "p", "b": "q",}, "correct_answer": "b"}, '
+        '{"question": "trunc'
+    )
+    questions = salvage_questions(response)
+    assert [q["question"] for q in questions] == ["Keep “this”", "Second"]
+    assert questions[0]["options"]["a"] == "x, ]"
+
+
+def test_uppercase_option_keys_are_accepted_and_normalised():
+    question = _question("Q1?", correct="A", A="First", B="Second")
+    assert is_valid_question(question)
+    for response in (
+        json.dumps({"questions": [question]}),
+        '{"questions": [' + json.dumps(question) + ', {"question": "cut',
+    ):
+        quiz = parse_quiz_response(response)
+        assert quiz["questions"][0]["options"] == {"a": "First", "b": "Second"}
+        assert quiz["questions"][0]["correct_answer"] == "a"
+
+
+def test_no_questions_raises():
+    with pytest.raises(ValueError):
+        parse_quiz_response("Sorry, I cannot help with that.")
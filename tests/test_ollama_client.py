@@ -0,0 +1,99 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import backend.ollama_client as ollama_client_module
+from backend.ollama_client import OllamaClient, OllamaError, stream_ollama
+
+
+class StubOllama:
+    """
+    Local stand-in for the Ollama API. Each POST takes the next scripted
+    (status, body lines) reply; the last one is repeated once the script
+    runs out.
+    """
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                stub.requests.append(json.loads(self.rfile.read(length)))
+                status, lines = stub.replies.pop(0) if len(stub.replies) > 1 else stub.replies[0]
+                body = "".join(json.dumps(line) + "\n" for line in lines).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/api/generate"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    monkeypatch.setattr(ollama_client_module, "BACKOFF_BASE", 0.001)
+    servers = []
+
+    def start(*replies):
+        server = StubOllama(replies)
+        servers.append(server)
+        return server, OllamaClient(api_url=server.url, model="stub", max_retries=2)
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def test_generate_retries_503_then_succeeds(stub_server):
+    server, client = stub_server((503, []), (200, [{"response": "Hello", "done": True}]))
+    assert client.generate("hi") == "Hello"
+    assert len(server.requests) == 2
+    assert server.requests[0]["model"] == "stub"
+
+
+def test_generate_gives_up_after_max_retries(stub_server):
+    server, client = stub_server((503, []))
+    with pytest.raises(OllamaError):
+        client.generate("hi")
+    assert len(server.requests) == 3
+
+
+def test_stream_retries_before_first_token(stub_server):
+    tokens = [{"response": "Hel"}, {"response": "lo"}, {"done": True}]
+    server, client = stub_server((503, []), (200, tokens))
+    stats = {}
+    assert "".join(client.stream("hi", stats=stats)) == "Hello"
+    assert len(server.requests) == 2
+    assert "first_token_seconds" in stats and "total_seconds" in stats
+
+
+def test_stream_error_after_tokens_is_not_retried(stub_server):
+    server, client = stub_server((200, [{"response": "Partial"}, {"error": "model crashed"}]))
+    received = []
+    with pytest.raises(OllamaError):
+        for token in client.stream("hi"):
+            received.append(token)
+    assert received == ["Partial"]
+    assert len(server.requests) == 1
+
+
+def test_stream_ollama_reports_mid_stream_error_out_of_band(stub_server, monkeypatch):
+    _, client = stub_server((200, [{"response": "Partial"}, {"error": "model crashed"}]))
+    monkeypatch.setattr(ollama_client_module, "ollama_client", client)
+    stats = {}
+    tokens = list(stream_ollama("hi", stats, use_cache=False))
+    assert tokens == ["Partial"]
+    assert "model crashed" in stats["error"]
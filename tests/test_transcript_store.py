@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+import pytest
+from backend.transcript_store import TranscriptStore, iter_transcript_chunks
+from backend.video_info_cache import VideoInfoCache
+
+VIDEO_ID = "dQw4w9WgXcQ"
+
+
+def _transcript(text="hello world", language="en"):
+    return {
+        "text": text,
+        "language": language,
+        "segments": [{"start": 0, "end": 1.5, "text": text}],
+    }
+
+
+def test_put_get_round_trip_is_keyed_by_model_and_language(tmp_path):
+    store = TranscriptStore(root=str(tmp_path))
+    record = store.put(VIDEO_ID, "base", None, _transcript())
+    assert store.get(VIDEO_ID, "base") == record
+    assert record["segments"] == [{"start": 0.0, "end": 1.5, "text": "hello world"}]
+    assert store.get(VIDEO_ID, "small") is None
+    assert store.get(VIDEO_ID, "base", "de") is None
+
+
+def test_concurrent_puts_leave_one_intact_file(tmp_path):
+    store = TranscriptStore(root=str(tmp_path))
+    errors = []
+
+    def write(n):
+        try:
+            for _ in range(20):
+                store.put(VIDEO_ID, "base", "en", _transcript(f"writer {n} " * 200))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert [name for name in os.listdir(tmp_path) if name.startswith(".tmp-")] == []
+    assert store.get(VIDEO_ID, "base", "en")["text"].startswith("writer ")
+
+
+def test_chunks_map_back_to_segment_times():
+    segments = [{"start": i * 10.0, "end": i * 10.0 + 9, "text": "word " * 10} for i in range(10)]
+    chunks = list(iter_transcript_chunks(segments, chunk_size=30, overlap=10))
+    assert [(c["first_segment"], c["last_segment"]) for c in chunks] == [(0, 2), (2, 4), (4, 6), (6, 8), (8, 9)]
+    assert (chunks[1]["start"], chunks[1]["end"]) == (20.0, 49.0)
+    assert len(chunks[0]["text"].split()) == 30
+
+
+def test_overlap_must_be_smaller_than_chunk_size():
+    with pytest.raises(ValueError):
+        list(iter_transcript_chunks([], chunk_size=10, overlap=10))
+
+
+def test_concurrent_jobs_transcribe_a_video_once(tmp_path):
+    # youtube_processor imports yt-dlp and Whisper at module level
+    pytest.importorskip("yt_dlp")
+    pytest.importorskip("whisper")
+    from backend.youtube_processor import YouTubeProcessor
+
+    processor = YouTubeProcessor(
+        extractor=lambda url: {"title": "T", "duration": 60},
+        info_cache=VideoInfoCache(path=str(tmp_path / "cache.sqlite3")),
+        transcripts=TranscriptStore(root=str(tmp_path / "transcripts")),
+    )
+    processor.choose_whisper_model = lambda duration: "base"
+    calls = []
+
+    def transcribe_video(youtube_url, language, model_name):
+        calls.append(youtube_url)
+        time.sleep(0.2)
+        return _transcript()
+
+    processor._transcribe_video = transcribe_video
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(processor.get_transcript(f"https://youtu.be/{VIDEO_ID}")))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert [r["text"] for r in results] == ["hello world"] * 4
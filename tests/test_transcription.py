@@ -0,0 +1,107 @@
+import wave
+from contextlib import contextmanager
+import numpy as np
+import pytest
+import backend.transcription as transcription
+from backend.transcription import SAMPLE_RATE, split_on_silence, transcribe, transcribe_stream
+
+
+def _tone(seconds, amplitude=0.3, frequency=440):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype("float32")
+
+
+def _silence(seconds):
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype="float32")
+
+
+def _through_wav(tmp_path, audio):
+    """Round-trip audio through a 16 kHz mono 16-bit WAV, like a decoded recording"""
+    path = tmp_path / "speech.wav"
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes((np.clip(audio, -1, 1) * 32767).astype("<i2").tobytes())
+    with wave.open(str(path), "rb") as f:
+        frames = f.readframes(f.getnframes())
+    return np.frombuffer(frames, dtype="<i2").astype("float32") / 32768
+
+
+def _seconds(ranges):
+    return [(round(start / SAMPLE_RATE, 1), round(end / SAMPLE_RATE, 1)) for start, end in ranges]
+
+
+def test_splits_in_the_middle_of_pauses(tmp_path):
+    audio = _through_wav(tmp_path, np.concatenate([_tone(2), _silence(1), _tone(2), _silence(1), _tone(2)]))
+    assert _seconds(split_on_silence(audio, target_seconds=1)) == [(0, 2.5), (2.5, 5.5), (5.5, 8)]
+
+
+def test_drops_segments_that_are_only_silence(tmp_path):
+    audio = _through_wav(tmp_path, np.concatenate([_tone(2), _silence(5)]))
+    assert _seconds(split_on_silence(audio, target_seconds=1)) == [(0, 4.5)]
+    assert split_on_silence(_silence(3)) == []
+
+
+def test_keeps_quiet_speech_between_loud_speech(tmp_path):
+    # No true silence: the quiet passage becomes the noise floor but is still speech
+    audio = _through_wav(tmp_path, np.concatenate([_tone(3, 0.5), _tone(3, 0.01), _tone(3, 0.5)]))
+    ranges = split_on_silence(audio, target_seconds=1)
+    assert len(ranges) > 1
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(audio)
+    assert all(previous[1] == following[0] for previous, following in zip(ranges, ranges[1:]))
+
+
+class FakeModel:
+    """Reports two segments per call, timed relative to the audio it was given"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def transcribe(self, audio, language=None):
+        self.calls += 1
+        duration = len(audio) / SAMPLE_RATE
+        return {"language": "en", "segments": [
+            {"start": 0.0, "end": 1.0, "text": " one"},
+            {"start": 1.0, "end": duration, "text": " two"},
+        ]}
+
+
+class FakeWhisperManager:
+    def __init__(self):
+        self.model = FakeModel()
+
+    @contextmanager
+    def acquire(self, model_name=None):
+        yield self.model
+
+    def record_speed(self, model_name, audio_seconds, compute_seconds):
+        pass
+
+
+@pytest.fixture
+def fake_whisper(monkeypatch):
+    manager = FakeWhisperManager()
+    monkeypatch.setattr(transcription, "whisper_manager", manager)
+    return manager
+
+
+def test_streamed_transcript_matches_batch_with_global_timestamps(tmp_path, fake_whisper):
+    # Longer than one streaming window, so segments are emitted while audio still arrives
+    parts = []
+    for _ in range(12):
+        parts += [_tone(20), _silence(1)]
+    audio = _through_wav(tmp_path, np.concatenate(parts))
+    chunk = 5 * SAMPLE_RATE
+    streamed = transcribe_stream((audio[i:i + chunk] for i in range(0, len(audio), chunk)), "base", workers=1)
+    batch = transcribe(audio, "base", workers=1)
+
+    assert streamed == batch
+    assert streamed["language"] == "en"
+    starts = [s["start"] for s in streamed["segments"][::2]]
+    assert starts[0] == 0.0
+    # Every later segment starts inside one of the one-second pauses
+    assert all(20 <= start % 21 <= 21 for start in starts[1:])
+    # The last tone is kept whole; only the silent tail after it is dropped
+    assert 251 <= streamed["segments"][-1]["end"] <= 252
+    assert fake_whisper.model.calls == 2 * len(starts)
@@ -0,0 +1,92 @@
+import pytest
+import backend.video_info_cache as video_info_cache_module
+from backend.video_info_cache import VideoInfoCache
+
+VIDEO_ID = "dQw4w9WgXcQ"
+VIDEO_URL = f"https://youtu.be/{VIDEO_ID}?t=42"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+class FakeExtractor:
+    """Stands in for yt-dlp and records which URLs it was asked about"""
+
+    def __init__(self):
+        self.urls = []
+
+    def __call__(self, url):
+        self.urls.append(url)
+        return {"title": f"Title {len(self.urls)}", "duration": 120, "url": "https://signed/stream"}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(video_info_cache_module, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    return VideoInfoCache(path=str(tmp_path / "cache.sqlite3"), ttl_seconds=100, raw_ttl_seconds=10)
+
+
+def test_summary_expires_after_ttl(cache, clock):
+    cache.put(VIDEO_ID, {"title": "T"})
+    clock.now += 99
+    assert cache.get(VIDEO_ID) == {"title": "T"}
+    clock.now += 2
+    assert cache.get(VIDEO_ID) is None
+
+
+def test_raw_info_expires_before_summary(cache, clock):
+    cache.put(VIDEO_ID, {"title": "T"}, raw={"url": "https://signed/stream"})
+    assert cache.get_raw(VIDEO_ID) == {"url": "https://signed/stream"}
+    clock.now += 11
+    assert cache.get_raw(VIDEO_ID) is None
+    assert cache.get(VIDEO_ID) == {"title": "T"}
+
+
+def test_summary_survives_a_new_cache_instance(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite3")
+    VideoInfoCache(path=path).put(VIDEO_ID, {"title": "T"}, raw={"url": "x"})
+    reopened = VideoInfoCache(path=path)
+    assert reopened.get(VIDEO_ID) == {"title": "T"}
+    assert reopened.get_raw(VIDEO_ID) is None
+
+
+@pytest.fixture
+def processor_class():
+    # youtube_processor imports yt-dlp and Whisper at module level
+    pytest.importorskip("yt_dlp")
+    pytest.importorskip("whisper")
+    from backend.youtube_processor import YouTubeProcessor
+    return YouTubeProcessor
+
+
+def test_video_info_is_extracted_once_per_ttl(processor_class, cache, clock):
+    extractor = FakeExtractor()
+    processor = processor_class(extractor=extractor, info_cache=cache)
+    assert processor.get_video_info(VIDEO_URL)["title"] == "Title 1"
+    assert processor.get_video_info(f"https://www.youtube.com/watch?v={VIDEO_ID}")["title"] == "Title 1"
+    assert extractor.urls == [f"https://www.youtube.com/watch?v={VIDEO_ID}"]
+    clock.now += 101
+    assert processor.get_video_info(VIDEO_URL)["title"] == "Title 2"
+    assert len(extractor.urls) == 2
+
+
+def test_download_reuses_fresh_raw_info(processor_class, cache, clock):
+    extractor = FakeExtractor()
+    processor = processor_class(extractor=extractor, info_cache=cache)
+    processor.get_video_info(VIDEO_URL)
+    assert processor._get_raw_info(VIDEO_URL)["url"] == "https://signed/stream"
+    assert len(extractor.urls) == 1
+    clock.now += 11
+    processor._get_raw_info(VIDEO_URL)
+    assert len(extractor.urls) == 2